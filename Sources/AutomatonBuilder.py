@@ -0,0 +1,183 @@
+from array import array
+
+from HybridAutomaton import create_automate
+
+"""
+Builder for large, programmatically generated hybrid automata.
+The functions of HybridAutomaton.py check the discrete states in the list Q,
+which makes building models with 10^4+ modes quadratic. The builder indexes
+the modes by name and stores the transitions in compact arrays of integer ids,
+then produces the usual automaton structure (Q, flow, Inv, Guard, Jump, Event
+and the list of transitions T) consumed by simulate, the exporter and the
+visualizer.
+"""
+
+_NONE = -1  # Id of a missing event, guard or reset name
+
+
+class AutomatonBuilder:
+    """
+    Builds an automaton with O(1) operations.
+    Usage:
+        builder = AutomatonBuilder()
+        builder.add_states(f"Q{i}" for i in range(10000))
+        builder.add_transitions((f"Q{i}", f"Q{i + 1}", None, guard, None) for i in range(9999))
+        A = builder.build()
+    """
+
+    __slots__ = (
+        "_built",
+        "_dst",
+        "_event",
+        "_guard",
+        "_index",
+        "_reset",
+        "_src",
+        "_string_index",
+        "_strings",
+        "automate",
+    )
+
+    def __init__(self, automate=None):
+        self.automate = automate if automate is not None else create_automate()
+        self._index = {q: i for i, q in enumerate(self.automate["Q"])}
+        # Transition records: one entry per transition in each array
+        self._src = array("i")
+        self._dst = array("i")
+        self._event = array("i")
+        self._guard = array("i")
+        self._reset = array("i")
+        # Interned event, guard and reset names
+        self._strings = []
+        self._string_index = {}
+        self._built = 0
+
+    # --- Discrete states ---
+
+    def add_state(self, q_name):
+        """Adds a discrete state (if new) and returns its id"""
+        state_id = self._index.get(q_name)
+        if state_id is None:
+            state_id = len(self.automate["Q"])
+            self._index[q_name] = state_id
+            self.automate["Q"].append(q_name)
+        return state_id
+
+    def add_states(self, q_names):
+        """Adds many discrete states. Returns their ids"""
+        return [self.add_state(q) for q in q_names]
+
+    def state_id(self, q_name):
+        """Returns the id of an existing discrete state"""
+        state_id = self._index.get(q_name)
+        if state_id is None:
+            raise ValueError(f"The discreate state '{q_name}' does not exist.")
+        return state_id
+
+    def __contains__(self, q_name):
+        return q_name in self._index
+
+    def set_flow(self, q_name, dynamique):
+        """Sets the flow function for a given state q in Q"""
+        self.state_id(q_name)
+        self.automate["flow"][q_name] = dynamique
+
+    def set_flows(self, flows):
+        """Sets many flow functions from a mapping q -> flow"""
+        for q, f in flows.items():
+            self.set_flow(q, f)
+
+    def set_invariant(self, q_name, invariant_func):
+        """Sets the invariant condition for a given state q in Q"""
+        self.state_id(q_name)
+        self.automate["Inv"][q_name] = invariant_func
+
+    def set_invariants(self, invariants):
+        """Sets many invariants from a mapping q -> invariant"""
+        for q, f in invariants.items():
+            self.set_invariant(q, f)
+
+    # --- Transitions ---
+
+    def _intern(self, name):
+        if name is None:
+            return _NONE
+        string_id = self._string_index.get(name)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._string_index[name] = string_id
+            self._strings.append(name)
+        return string_id
+
+    def add_transition(self, q_from, q_to, event=None, guard=None, reset=None):
+        """
+        Adds a transition. The guard and the reset are either functions, which are
+        registered in Guard and Jump, or function names.
+        Parameters:
+            q_from (str): Origin state.
+            q_to (str): Destination state.
+            event (str): Event label.
+            guard (callable or str): Guard function.
+            reset (callable or str): Reset function.
+        """
+        src = self._index.get(q_from)
+        dst = self._index.get(q_to)
+        if src is None or dst is None:
+            raise ValueError(f"The couple ({q_from}, {q_to}) is not valid in Q × Q.")
+        A = self.automate
+        # The simulation looks for the outgoing transitions in Guard
+        if callable(guard):
+            A["Guard"].setdefault(q_from, {})[q_to] = guard
+        else:
+            A["Guard"].setdefault(q_from, {}).setdefault(q_to, None)
+        if callable(reset):
+            A["Jump"].setdefault(q_from, {})[q_to] = reset
+        if event is not None:
+            A.setdefault("Event", {}).setdefault(q_from, {})[q_to] = event
+
+        self._src.append(src)
+        self._dst.append(dst)
+        self._event.append(self._intern(event))
+        self._guard.append(self._intern(guard.__name__ if callable(guard) else guard))
+        self._reset.append(self._intern(reset.__name__ if callable(reset) else reset))
+
+    def add_transitions(self, transitions):
+        """
+        Adds many transitions given as tuples (q_from, q_to[, event, guard, reset])
+        or as dicts with the same keys.
+        """
+        for transition in transitions:
+            if isinstance(transition, dict):
+                self.add_transition(**transition)
+            else:
+                self.add_transition(*transition)
+
+    def __len__(self):
+        return len(self._src)
+
+    # --- Result ---
+
+    def build(self):
+        """
+        Appends the transitions added since the last call to T and returns the
+        automaton structure.
+        """
+        Q = self.automate["Q"]
+        strings = self._strings
+
+        def name(string_id):
+            return None if string_id == _NONE else strings[string_id]
+
+        T = self.automate["T"]
+        for k in range(self._built, len(self._src)):
+            T.append(
+                {
+                    "q_from": Q[self._src[k]],
+                    "q_to": Q[self._dst[k]],
+                    "event": name(self._event[k]),
+                    "guard": name(self._guard[k]),
+                    "reset": name(self._reset[k]),
+                }
+            )
+        self._built = len(self._src)
+        return self.automate
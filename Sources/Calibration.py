@@ -0,0 +1,438 @@
+import math
+import random
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+from Sensitivity import simulate_sensitivity
+from Simulation import simulate
+
+"""
+Identification of the parameters of a hybrid automaton from measured data.
+The data is a list of samples (t, q, x): q may be None when the discrete state
+is not measured, and the entries of x may be None when a variable is not
+measured. The loss of a run is the weighted sum of the squared errors on x
+(linearly interpolated at the measurement times) plus mode_penalty for each
+sample whose discrete state differs.
+A Calibration evaluates whole populations of candidates at once (in parallel
+processes with workers > 1), stops the runs whose loss exceeds the loss to beat
+(see LossMonitor) and caches the evaluations of the candidates already seen.
+With workers > 1 the factory must be picklable (module-level function).
+"""
+
+
+class LossMonitor:
+    """
+    Online monitor (see simulate) accumulating the loss of a run against data.
+    Its verdict becomes False as soon as the loss exceeds bound, which stops the
+    simulation, and True at the end of the run otherwise.
+    """
+
+    def __init__(self, data, weights=None, mode_penalty=1.0, bound=math.inf):
+        self.data = sorted(data, key=lambda sample: sample[0])
+        self.weights = weights
+        self.mode_penalty = mode_penalty
+        self.bound = bound
+        self.loss = 0.0
+        self.verdict = None
+        self.decided_at = None
+        self._index = 0
+        self._previous = None
+
+    def _error(self, q_data, x_data, q, x):
+        error = 0.0
+        for i, value in enumerate(x_data):
+            if value is not None:
+                w = self.weights[i] if self.weights else 1.0
+                error += w * (x[i] - value) ** 2
+        if q_data is not None and q_data != q:
+            error += self.mode_penalty
+        return error
+
+    def update(self, t, q, x):
+        data = self.data
+        while self._index < len(data) and data[self._index][0] <= t:
+            t_data, q_data, x_data = data[self._index]
+            if self._previous is None or t_data >= t:
+                q_model, x_model = q, x
+            else:
+                # Linear interpolation of x, the discrete state holds until t
+                t_prev, q_model, x_prev = self._previous
+                w = (t_data - t_prev) / (t - t_prev)
+                x_model = [a + (b - a) * w for a, b in zip(x_prev, x)]
+            self.loss += self._error(q_data, x_data, q_model, x_model)
+            self._index += 1
+        self._previous = (t, q, list(x))
+        if self.verdict is None and self.loss > self.bound:
+            self.verdict = False
+            self.decided_at = t
+        return self.verdict
+
+    def finish(self, t):
+        if self.verdict is not None:
+            return
+        # The samples measured after the end of the run are compared with its last state
+        if self._previous is not None:
+            _, q, x = self._previous
+            for _, q_data, x_data in self.data[self._index :]:
+                self.loss += self._error(q_data, x_data, q, x)
+            self._index = len(self.data)
+        self.verdict = self.loss <= self.bound
+        self.decided_at = t
+
+
+def trace_loss(trace, data, weights=None, mode_penalty=1.0):
+    """Returns the loss of a trace against measured data"""
+    monitor = LossMonitor(data, weights, mode_penalty)
+    t = 0.0
+    for t, q, x in trace:
+        monitor.update(t, q, x)
+    monitor.finish(t)
+    return monitor.loss
+
+
+def _run_loss(
+    factory, data, dt, t_max, event_schedule, weights, mode_penalty, params, bound
+):
+    """Simulates factory(params) against the data. Returns (loss, complete)"""
+    monitor = LossMonitor(data, weights, mode_penalty, bound)
+    simulate(factory(params), dt, t_max, event_schedule, monitors=[monitor])
+    return monitor.loss, monitor.verdict
+
+
+def _solve(matrix, vector):
+    """Solves a small linear system by Gaussian elimination with partial pivoting"""
+    n = len(vector)
+    m = [list(row) + [b] for row, b in zip(matrix, vector)]
+    for k in range(n):
+        pivot = max(range(k, n), key=lambda i: abs(m[i][k]))
+        if m[pivot][k] == 0.0:
+            raise ValueError("Singular system: a parameter has no effect on the data.")
+        m[k], m[pivot] = m[pivot], m[k]
+        for i in range(k + 1, n):
+            factor = m[i][k] / m[k][k]
+            for j in range(k, n + 1):
+                m[i][j] -= factor * m[k][j]
+    solution = [0.0] * n
+    for k in reversed(range(n)):
+        s = sum(m[k][j] * solution[j] for j in range(k + 1, n))
+        solution[k] = (m[k][n] - s) / m[k][k]
+    return solution
+
+
+def _clip(value, bound):
+    if bound is None:
+        return value
+    low, high = bound
+    return min(max(value, low), high)
+
+
+class Calibration:
+    """
+    Fits the parameters of an automaton to measured data.
+    Parameters:
+        factory: Function params(dict) -> automaton, building a fresh automaton.
+        data: List of measured samples (t, q, x), or a Trace.
+        dt: Simulation step.
+        t_max: Simulation horizon (default: time of the last sample).
+        event_schedule: Event schedule of the simulations.
+        weights: Weight of each continuous variable in the loss.
+        mode_penalty: Loss of a sample whose discrete state differs.
+        workers: Number of processes evaluating a population.
+    """
+
+    def __init__(
+        self,
+        factory,
+        data,
+        dt=0.01,
+        t_max=None,
+        event_schedule=None,
+        weights=None,
+        mode_penalty=1.0,
+        workers=None,
+    ):
+        self.factory = factory
+        self.data = sorted(data, key=lambda sample: sample[0])
+        if not self.data:
+            raise ValueError("The data is empty.")
+        self.dt = dt
+        self.t_max = self.data[-1][0] if t_max is None else t_max
+        self.event_schedule = event_schedule
+        self.weights = weights
+        self.mode_penalty = mode_penalty
+        self.workers = workers
+        self.evaluations = 0  # Simulations run
+        self.cache_hits = 0
+        self._cache = {}  # Parameters -> (loss, complete)
+
+    def _arguments(self):
+        return (
+            self.factory,
+            self.data,
+            self.dt,
+            self.t_max,
+            self.event_schedule,
+            self.weights,
+            self.mode_penalty,
+        )
+
+    def _cached(self, key, bound):
+        # A run stopped early only tells that its loss exceeds a bound
+        entry = self._cache.get(key)
+        if entry is not None and (entry[1] or entry[0] > bound):
+            self.cache_hits += 1
+            return entry[0]
+        return None
+
+    def loss(self, params, bound=math.inf):
+        """
+        Returns the loss of the parameters. The run stops as soon as the loss
+        exceeds bound, and the partial loss (> bound) is returned.
+        """
+        key = tuple(sorted(params.items()))
+        loss = self._cached(key, bound)
+        if loss is None:
+            loss, complete = _run_loss(*self._arguments(), dict(params), bound)
+            self._cache[key] = (loss, complete)
+            self.evaluations += 1
+        return loss
+
+    def evaluate(self, population, bounds=None, executor=None):
+        """
+        Returns the losses of a population of parameter dicts.
+        Parameters:
+            population: List of parameter dicts.
+            bounds: Losses to beat, one per candidate (early termination).
+            executor: Executor running the simulations (default: self.workers processes).
+        """
+        bounds = bounds or [math.inf] * len(population)
+        losses = [None] * len(population)
+        jobs = {}
+        for i, (params, bound) in enumerate(zip(population, bounds)):
+            key = tuple(sorted(params.items()))
+            losses[i] = self._cached(key, bound)
+            if losses[i] is None:
+                # Duplicated candidates are simulated once, with the largest bound
+                _, largest, indices = jobs.get(key, (params, bound, []))
+                jobs[key] = (params, max(bound, largest), indices + [i])
+        if not jobs:
+            return losses
+
+        own_executor = None
+        if executor is None and self.workers and self.workers > 1 and len(jobs) > 1:
+            executor = own_executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            arguments = self._arguments()
+            if executor is None:
+                results = [
+                    _run_loss(*arguments, dict(p), b) for p, b, _ in jobs.values()
+                ]
+            else:
+                futures = [
+                    executor.submit(_run_loss, *arguments, dict(p), b)
+                    for p, b, _ in jobs.values()
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            if own_executor is not None:
+                own_executor.shutdown()
+
+        for (key, (_, _, indices)), result in zip(jobs.items(), results):
+            self._cache[key] = result
+            self.evaluations += 1
+            for i in indices:
+                losses[i] = result[0]
+        return losses
+
+    def differential_evolution(
+        self,
+        bounds,
+        population_size=None,
+        generations=100,
+        mutation=0.8,
+        crossover=0.9,
+        tol=1e-8,
+        seed=None,
+    ):
+        """
+        Fits the parameters with differential evolution (DE/rand/1/bin). Each
+        generation is evaluated in one call, and a trial is stopped as soon as
+        its loss exceeds the loss of the candidate it would replace.
+        Parameters:
+            bounds (dict): Parameter name -> (low, high).
+            population_size: Number of candidates (default: 10 per parameter, at least 4).
+            generations: Maximum number of generations.
+            mutation, crossover: Differential weight and crossover probability.
+            tol: Stops when the losses of the population are within tol.
+            seed: Seed of the random choices.
+        Returns:
+            dict: "params", "loss", "generations", "evaluations" and "history"
+            (best loss of each generation).
+        """
+        names = list(bounds)
+        ranges = [bounds[name] for name in names]
+        dim = len(names)
+        n = max(4, population_size or 10 * dim)
+        rng = random.Random(seed)
+
+        def as_params(vector):
+            return dict(zip(names, vector))
+
+        executor = None
+        if self.workers and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            population = [
+                [low + rng.random() * (high - low) for low, high in ranges]
+                for _ in range(n)
+            ]
+            losses = self.evaluate(
+                [as_params(v) for v in population], executor=executor
+            )
+            history = [min(losses)]
+            generation = 0
+            while generation < generations and max(losses) - min(losses) > tol:
+                generation += 1
+                trials = []
+                for i in range(n):
+                    a, b, c = rng.sample([j for j in range(n) if j != i], 3)
+                    forced = rng.randrange(dim)
+                    trial = [
+                        _clip(
+                            population[a][k]
+                            + mutation * (population[b][k] - population[c][k]),
+                            ranges[k],
+                        )
+                        if k == forced or rng.random() < crossover
+                        else population[i][k]
+                        for k in range(dim)
+                    ]
+                    trials.append(trial)
+                trial_losses = self.evaluate(
+                    [as_params(v) for v in trials], bounds=losses, executor=executor
+                )
+                for i, loss in enumerate(trial_losses):
+                    if loss <= losses[i]:
+                        population[i], losses[i] = trials[i], loss
+                history.append(min(losses))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        best = min(range(n), key=losses.__getitem__)
+        return {
+            "params": as_params(population[best]),
+            "loss": losses[best],
+            "generations": generation,
+            "evaluations": self.evaluations,
+            "history": history,
+        }
+
+    def _residuals(self, params, surfaces, jacobians):
+        """Weighted residuals on x at the measurement times and their Jacobian"""
+        trace, sensitivities = simulate_sensitivity(
+            self.factory,
+            params,
+            self.dt,
+            self.t_max,
+            self.event_schedule,
+            surfaces,
+            jacobians,
+        )
+        key = tuple(sorted(params.items()))
+        loss = trace_loss(trace, self.data, self.weights, self.mode_penalty)
+        self._cache[key] = (loss, True)
+        self.evaluations += 1
+
+        times = trace.t
+        residuals, rows = [], []
+        for t_data, _, x_data in self.data:
+            k = max(bisect_right(times, t_data) - 1, 0)
+            if k + 1 < len(times):
+                w = (t_data - times[k]) / (times[k + 1] - times[k])
+            else:
+                k, w = len(times) - 1, 0.0
+            nxt = min(k + 1, len(times) - 1)
+            for i, value in enumerate(x_data):
+                if value is None:
+                    continue
+                scale = math.sqrt(self.weights[i] if self.weights else 1.0)
+                column = trace.x[i]
+                x_model = column[k] + (column[nxt] - column[k]) * w
+                s_k, s_next = sensitivities[k][i], sensitivities[nxt][i]
+                residuals.append(scale * (x_model - value))
+                rows.append([scale * (a + (b - a) * w) for a, b in zip(s_k, s_next)])
+        return residuals, rows, loss
+
+    def gauss_newton(
+        self,
+        initial,
+        bounds=None,
+        surfaces=None,
+        jacobians=None,
+        iterations=50,
+        damping=1e-3,
+        tol=1e-10,
+    ):
+        """
+        Fits the parameters with the Levenberg-Marquardt method, the Jacobian of
+        the residuals being the parametric sensitivities (see Sensitivity.py).
+        The discrete states only count in the loss used to accept a step.
+        Parameters:
+            initial (dict): Initial parameter values.
+            bounds (dict): Optional parameter name -> (low, high).
+            surfaces, jacobians: Switching surfaces and exact Jacobians (see
+                simulate_sensitivity).
+            iterations: Maximum number of accepted steps.
+            damping: Initial damping of the steps.
+            tol: Stops when a step decreases the loss by less than tol (relative).
+        Returns:
+            dict: "params", "loss", "iterations" and "evaluations".
+        """
+        bounds = bounds or {}
+        names = list(initial)
+        params = dict(initial)
+        residuals, rows, loss = self._residuals(params, surfaces, jacobians)
+        iteration = 0
+        while iteration < iterations and loss > 0.0:
+            gradient = [
+                sum(r * row[j] for r, row in zip(residuals, rows))
+                for j in range(len(names))
+            ]
+            hessian = [
+                [sum(row[i] * row[j] for row in rows) for j in range(len(names))]
+                for i in range(len(names))
+            ]
+            improved = False
+            while damping < 1e10:
+                system = [
+                    [
+                        h + (damping * (h + 1e-12) if i == j else 0.0)
+                        for j, h in enumerate(line)
+                    ]
+                    for i, line in enumerate(hessian)
+                ]
+                step = _solve(system, [-g for g in gradient])
+                candidate = {
+                    name: _clip(params[name] + s, bounds.get(name))
+                    for name, s in zip(names, step)
+                }
+                if self.loss(candidate, bound=loss) < loss:
+                    improved = True
+                    damping /= 10
+                    break
+                damping *= 10
+            if not improved:
+                break
+            iteration += 1
+            previous = loss
+            params = candidate
+            residuals, rows, loss = self._residuals(params, surfaces, jacobians)
+            if previous - loss <= tol * previous:
+                break
+        return {
+            "params": params,
+            "loss": loss,
+            "iterations": iteration,
+            "evaluations": self.evaluations,
+        }
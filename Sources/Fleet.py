@@ -0,0 +1,327 @@
+import heapq
+import math
+from array import array
+
+from Simulation import is_constant_flow
+from Stochastic import RandomStream, accept_candidate, sample_delay, sample_delays
+
+"""
+Discrete-event simulation of fleets of independent instances of one automaton.
+The model is compiled once and shared by every instance: it must have constant
+flows (see is_constant_flow), like the machine-repair model, so that x is linear
+in each mode and the next transition of an instance can be computed when it
+enters a mode:
+    - a guard fires at the first step (multiple of dt after the entry) where it
+      holds, found by exponential search and bisection (the guards of moving
+      modes must stay true once true, e.g. thresholds),
+    - an event fires dt after its flag becomes true (as in simulate),
+    - a stochastic transition fires at its sampled time (see Stochastic.py).
+The state of the instances lives in flat arrays (mode code, entry time, x at the
+entry and the firing time of each edge), and a priority queue holds the next
+transition time of each instance: only the instances whose transition is due
+are processed, idle instances cost nothing. The number of instances in each
+mode is updated at each transition.
+"""
+
+INF = math.inf
+MAX_GUARD_STEPS = 2**48  # Guards not true after that many steps never fire
+
+
+class Fleet:
+    """
+    Fleet of n instances of the automaton A, all starting in (A["q"], A["x"]).
+    Parameters:
+        A (dict): The shared model (not modified).
+        n: Number of instances.
+        dt: Time step of the guards and events (see above).
+        rng: RandomStream (or seed) of the stochastic transitions.
+        x0: Optional function i -> initial continuous state of instance i.
+    """
+
+    def __init__(self, A, n, dt=0.01, rng=None, x0=None):
+        if A.get("Input"):
+            raise ValueError("Fleets do not support input signals.")
+        self.modes = list(A["Q"])
+        self.names = list(A["X"])
+        self.events = list(A["E"])
+        self.n = n
+        self.dt = dt
+        self.t = 0.0
+        self.transitions = 0
+        self._stream = rng if isinstance(rng, RandomStream) else RandomStream(rng)
+        code = {q: k for k, q in enumerate(self.modes)}
+        event_code = {e: k for k, e in enumerate(self.events)}
+
+        # Compiled model: constant flow and outgoing edges of each mode
+        self._flows = []
+        self._edges = []
+        for q in self.modes:
+            flow = A["flow"][q]
+            if not is_constant_flow(flow):
+                raise ValueError(f"The flow of {q} is not constant: use simulate.")
+            self._flows.append(tuple(float(v) for v in flow(A["x"], 0.0)))
+            edges = []
+            for q2, guard in A["Guard"].get(q, {}).items():
+                event = A.get("Event", {}).get(q, {}).get(q2)
+                edges.append(
+                    (
+                        code[q2],
+                        guard if callable(guard) else None,
+                        A["Jump"].get(q, {}).get(q2),
+                        event_code[event] if event else -1,
+                        A.get("Rate", {}).get(q, {}).get(q2),
+                    )
+                )
+            self._edges.append(tuple(edges))
+        self._width = max(1, max(len(edges) for edges in self._edges))
+
+        # Per-instance state
+        width = self._width
+        q0 = code[A["q"]]
+        self._q = array("i", [q0]) * n
+        self._t_entry = array("d", [0.0]) * n
+        if x0 is None:
+            self._x = array("d", [float(v) for v in A["x"]]) * n
+        else:
+            self._x = array("d", [float(v) for i in range(n) for v in x0(i)])
+        self._version = array("q", [0]) * n
+        self._guard_at = array("d", [INF]) * (n * width)
+        self._clock_at = array("d", [INF]) * (n * width)
+        self._event_at = array("d", [INF]) * (n * width)
+        flags = bytes(bool(A["E"][e]) for e in self.events)
+        self._flags = bytearray(flags * n)
+        self._heap = []
+        self._schedule = []  # (time, order, instance or -1, event code, value)
+        self._next_event = 0
+
+        # Incremental metrics
+        self._counts = [0] * len(self.modes)
+        self._counts[q0] = n
+        self._area = [0.0] * len(self.modes)
+        self._last_change = [0.0] * len(self.modes)
+        self._history = [(array("d", [0.0]), array("q", [c])) for c in self._counts]
+
+        self._initialize(q0, x0 is None)
+
+    # --- Model evaluation ---
+
+    def _x_at(self, i, t):
+        dim = len(self.names)
+        flow = self._flows[self._q[i]]
+        elapsed = t - self._t_entry[i]
+        x = self._x[i * dim : (i + 1) * dim]
+        return [a + c * elapsed for a, c in zip(x, flow)]
+
+    def _guard_time(self, m, guard, x, t):
+        """Time of the first step after t where the guard holds"""
+        flow, dt = self._flows[m], self.dt
+
+        def holds(k):
+            return guard([a + c * k * dt for a, c in zip(x, flow)])
+
+        if not any(flow):
+            return t + dt if guard(x) else INF
+        if holds(1):
+            return t + dt
+        low, high = 1, 2  # False at low
+        while not holds(high):
+            low, high = high, 2 * high
+            if high > MAX_GUARD_STEPS:
+                return INF
+        while high - low > 1:
+            middle = (low + high) // 2
+            if holds(middle):
+                high = middle
+            else:
+                low = middle
+        return t + high * dt
+
+    def _push(self, i):
+        """Schedules the next transition of instance i"""
+        base = i * self._width
+        next_time = INF
+        for e in range(len(self._edges[self._q[i]])):
+            next_time = min(
+                next_time,
+                self._guard_at[base + e],
+                self._clock_at[base + e],
+                self._event_at[base + e],
+            )
+        self._version[i] += 1
+        if next_time < INF:
+            heapq.heappush(self._heap, (next_time, i, self._version[i]))
+
+    def _enter(self, i, m, t, x, guard_times=None, delays=None):
+        """Instance i enters the mode m at time t with the state x"""
+        dim, width = len(self.names), self._width
+        self._q[i] = m
+        self._t_entry[i] = t
+        self._x[i * dim : (i + 1) * dim] = array("d", [float(v) for v in x])
+        base = i * width
+        n_events = len(self.events)
+        for e, (_, guard, _, event, rate) in enumerate(self._edges[m]):
+            if guard is None:
+                self._guard_at[base + e] = INF
+            elif guard_times is not None:
+                self._guard_at[base + e] = guard_times[e]
+            else:
+                self._guard_at[base + e] = self._guard_time(m, guard, x, t)
+            if rate is None:
+                self._clock_at[base + e] = INF
+            elif delays is not None and delays[e] is not None:
+                self._clock_at[base + e] = t + float(delays[e][i])
+            else:
+                self._clock_at[base + e] = t + sample_delay(rate, self._stream)
+            enabled = event >= 0 and self._flags[i * n_events + event]
+            self._event_at[base + e] = t + self.dt if enabled else INF
+        self._push(i)
+
+    def _initialize(self, m, shared_x0):
+        # Guard times are shared when every instance starts in the same state,
+        # and the delays of the usual laws are drawn in one batch
+        guard_times = None
+        if shared_x0 and self.n:
+            x = self._x_at(0, 0.0)
+            guard_times = [
+                self._guard_time(m, guard, x, 0.0) if guard else INF
+                for _, guard, _, _, _ in self._edges[m]
+            ]
+        delays = [
+            sample_delays(rate, self.n, self._stream)
+            if rate and rate["law"] in ("exponential", "weibull")
+            else None
+            for _, _, _, _, rate in self._edges[m]
+        ]
+        for i in range(self.n):
+            self._enter(i, m, 0.0, self._x_at(i, 0.0), guard_times, delays)
+
+    # --- Events ---
+
+    def schedule_event(self, time, name, value, instances=None):
+        """
+        Sets the event name to value at the given time, for the given instances
+        (default: every instance).
+        """
+        if name not in self.events:
+            raise ValueError(f"Unknown event '{name}'.")
+        if time < self.t:
+            raise ValueError("The event is in the past.")
+        event = self.events.index(name)
+        targets = [-1] if instances is None else list(instances)
+        pending = self._schedule[self._next_event :]
+        order = len(self._schedule)
+        for k, i in enumerate(targets):
+            pending.append((time, order + k, i, event, bool(value)))
+        pending.sort()
+        self._schedule = pending
+        self._next_event = 0
+
+    def _apply_event(self, time, instance, event, value):
+        n_events, width = len(self.events), self._width
+        targets = range(self.n) if instance < 0 else (instance,)
+        for i in targets:
+            self._flags[i * n_events + event] = value
+            base = i * width
+            changed = False
+            for e, edge in enumerate(self._edges[self._q[i]]):
+                if edge[3] != event:
+                    continue
+                if not value:
+                    changed = changed or self._event_at[base + e] < INF
+                    self._event_at[base + e] = INF
+                elif self._event_at[base + e] == INF:
+                    self._event_at[base + e] = time + self.dt
+                    changed = True
+            if changed:
+                self._push(i)
+
+    # --- Simulation ---
+
+    def _record(self, m, t, delta):
+        self._area[m] += self._counts[m] * (t - self._last_change[m])
+        self._last_change[m] = t
+        self._counts[m] += delta
+        times, counts = self._history[m]
+        times.append(t)
+        counts.append(self._counts[m])
+
+    def _fire(self, i, t):
+        m = self._q[i]
+        base = i * self._width
+        edges = self._edges[m]
+        best, best_time = 0, INF
+        for e in range(len(edges)):
+            fire_time = min(
+                self._guard_at[base + e],
+                self._clock_at[base + e],
+                self._event_at[base + e],
+            )
+            if fire_time < best_time:  # The first edge wins the ties, as in simulate
+                best, best_time = e, fire_time
+        q_to, _, jump, _, rate = edges[best]
+        x = self._x_at(i, t)
+        stochastic = (
+            self._clock_at[base + best] == t
+            and self._guard_at[base + best] > t
+            and self._event_at[base + best] > t
+        )
+        if stochastic and not accept_candidate(rate, self._stream, x, t):
+            # Rejected candidate of an intensity law: wait for the next one
+            self._clock_at[base + best] = t + sample_delay(rate, self._stream)
+            self._push(i)
+            return
+        if jump is not None:
+            x = list(jump(x))
+        self._record(m, t, -1)
+        self._record(q_to, t, +1)
+        self.transitions += 1
+        self._enter(i, q_to, t, x)
+
+    def run(self, t_max):
+        """Advances the fleet up to t_max (the method can be called again)"""
+        heap, schedule = self._heap, self._schedule
+        while True:
+            t_next = heap[0][0] if heap else INF
+            t_event = (
+                schedule[self._next_event][0]
+                if self._next_event < len(schedule)
+                else INF
+            )
+            if min(t_next, t_event) > t_max:
+                break
+            if t_event <= t_next:  # Events are applied before the transitions
+                time, _, instance, event, value = schedule[self._next_event]
+                self._next_event += 1
+                self._apply_event(time, instance, event, value)
+                continue
+            t, i, version = heapq.heappop(heap)
+            if version == self._version[i]:  # Otherwise rescheduled since
+                self._fire(i, t)
+        self.t = max(self.t, t_max)
+        return self
+
+    # --- Metrics ---
+
+    @property
+    def counts(self):
+        """Number of instances in each mode"""
+        return dict(zip(self.modes, self._counts))
+
+    def state(self, i):
+        """Returns (q, x) of instance i at the current time"""
+        return self.modes[self._q[i]], self._x_at(i, self.t)
+
+    def occupancy(self, q):
+        """
+        Returns (times, counts): the number of instances in q changes to
+        counts[k] at times[k].
+        """
+        return self._history[self.modes.index(q)]
+
+    def mean_occupancy(self, q):
+        """Time-average of the number of instances in q since t = 0"""
+        m = self.modes.index(q)
+        if self.t == 0:
+            return float(self._counts[m])
+        area = self._area[m] + self._counts[m] * (self.t - self._last_change[m])
+        return area / self.t
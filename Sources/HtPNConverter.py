@@ -0,0 +1,194 @@
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Conversion of exported hybrid automata (see export_automate_to_txt_with_functions)
+into Hybrid timed Petri Net (HtPN) models.
+Each discrete state becomes a place whose continuous dynamics is the flow of the
+state, and each transition of T becomes a Petri net transition with one input arc
+(from the place q_from) and one output arc (to the place q_to), carrying its
+event, guard, reset and delay law (for stochastic transitions). The generated
+model is a Python module which extends the configuration produced by
+generate_config_from_automate.
+"""
+
+CACHE_FILE = ".htpn_cache.json"
+
+
+def convert_automate_to_htpn(data, h_size=1):
+    """
+    Builds the HtPN model of an exported automaton.
+    Parameters:
+        data (dict): The JSON structure of the exported automaton.
+        h_size (int): Size of the H0 vector.
+    Returns:
+        dict: places, transitions, arcs (pre/post), dynamics and initial state.
+    """
+    flows = data.get("flow", {})
+    invariants = data.get("Inv", {})
+    places = [
+        {"name": q, "flow": flows.get(q), "invariant": invariants.get(q)}
+        for q in data["Q"]
+    ]
+    transitions = []
+    pre, post = [], []
+    for k, t in enumerate(data.get("T", []), start=1):
+        name = f"T{k}"
+        transitions.append(
+            {
+                "name": name,
+                "event": t.get("event"),
+                "guard": t.get("guard"),
+                "reset": t.get("reset"),
+                "rate": t.get("rate"),
+            }
+        )
+        pre.append((t["q_from"], name))  # Arc place -> transition
+        post.append((name, t["q_to"]))  # Arc transition -> place
+    return {
+        "places": places,
+        "transitions": transitions,
+        "pre": pre,
+        "post": post,
+        "variables": data.get("X", []),
+        "events": list(data.get("E", {})),
+        "functions": data.get("functions", {}),
+        "M0": [data.get("q0", "UNKNOWN")],
+        "T0": 0,
+        "X0": data.get("x0", []),
+        "H0": [0] * h_size,
+        "UC0": data.get("UC0", [0.0]),
+    }
+
+
+def _function_table(names):
+    items = ", ".join(f"{k!r}: {v if v else None}" for k, v in names)
+    return "{" + items + "}"
+
+
+def htpn_model_to_code(model):
+    """Returns the source code of the Python module describing the HtPN model"""
+    functions = model["functions"]
+
+    def ref(name):
+        # Function defined in the module, or None
+        return name if name in functions else None
+
+    places = [p["name"] for p in model["places"]]
+    transitions = [t["name"] for t in model["transitions"]]
+    events = {t["name"]: t["event"] for t in model["transitions"]}
+    rates = {t["name"]: t["rate"] for t in model["transitions"] if t["rate"]}
+    sources = "\n\n".join(code.rstrip() + "\n" for code in functions.values())
+    return f'''"""
+Auto-generated HtPN model
+"""
+
+import numpy as np
+
+# === Initial configuration ===
+M0 = {model["M0"]!r}
+T0 = {model["T0"]!r}
+X0 = {model["X0"]!r}
+H0 = {model["H0"]!r}
+UC0 = {model["UC0"]!r}
+
+# === Structure ===
+X = {model["variables"]!r}
+E = {model["events"]!r}
+PLACES = {places!r}
+TRANSITIONS = {transitions!r}
+PRE = {model["pre"]!r}  # Arcs place -> transition
+POST = {model["post"]!r}  # Arcs transition -> place
+EVENTS = {events!r}
+RATES = {rates!r}  # Delay laws of the stochastic transitions
+
+# === Functions of the hybrid automaton ===
+{sources}
+
+# === Continuous dynamics and conditions ===
+DYNAMICS = {_function_table((p["name"], ref(p["flow"])) for p in model["places"])}
+INVARIANTS = {_function_table((p["name"], ref(p["invariant"])) for p in model["places"])}
+GUARDS = {_function_table((t["name"], ref(t["guard"])) for t in model["transitions"])}
+RESETS = {_function_table((t["name"], ref(t["reset"])) for t in model["transitions"])}
+'''
+
+
+def convert_file(json_path, output_path, h_size=1):
+    """Converts one exported automaton into an HtPN model module"""
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    code = htpn_model_to_code(convert_automate_to_htpn(data, h_size))
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output_path, "w") as f:
+        f.write(code)
+    return output_path
+
+
+def _content_hash(path, h_size):
+    digest = hashlib.sha256(f"h_size={h_size}\n".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_directory(
+    input_dir, output_dir, pattern="*.txt", h_size=1, workers=None, cache_path=None
+):
+    """
+    Converts every exported automaton of a directory into an HtPN model module
+    <name>_htpn.py. The conversions run in parallel processes, and the automata
+    whose content did not change since the last run are skipped.
+    Parameters:
+        input_dir: Directory of the exported automata.
+        output_dir: Directory of the generated models.
+        pattern: Glob pattern of the exported automata.
+        h_size: Size of the H0 vector.
+        workers: Number of processes (default: number of CPUs).
+        cache_path: File storing the content hashes (default: output_dir/.htpn_cache.json).
+    Returns:
+        dict: Lists of the "converted" and "skipped" input files.
+    """
+    cache_path = cache_path or os.path.join(output_dir, CACHE_FILE)
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        cache = {}
+
+    jobs, skipped = [], []
+    for json_path in sorted(glob.glob(os.path.join(input_dir, pattern))):
+        name = os.path.splitext(os.path.basename(json_path))[0]
+        output_path = os.path.join(output_dir, f"{name}_htpn.py")
+        digest = _content_hash(json_path, h_size)
+        if cache.get(json_path) == digest and os.path.exists(output_path):
+            skipped.append(json_path)
+        else:
+            jobs.append((json_path, output_path, digest))
+
+    os.makedirs(output_dir, exist_ok=True)
+    error = None
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(convert_file, json_path, output_path, h_size)
+                for json_path, output_path, _ in jobs
+            ]
+            for (json_path, _, digest), future in zip(jobs, futures):
+                try:
+                    future.result()
+                    cache[json_path] = digest
+                except Exception as e:  # Converted files are still cached
+                    cache.pop(json_path, None)
+                    error = error or e
+
+    with open(cache_path, "w") as f:
+        json.dump(cache, f, indent=4)
+    if error is not None:
+        raise error
+    return {"converted": [job[0] for job in jobs], "skipped": skipped}
@@ -47,6 +47,19 @@ def define_input_space(automate, inputs):
     automate["U"] = inputs[:]
 
 
+def set_input(automate, u_name, signal):
+    """
+    Sets the signal (see InputSignal.create_input_signal) feeding the input u_name of U.
+    Once inputs are set, the flows are called as flow(x, t, u) with u the list of
+    the input values ordered as U.
+    """
+    if u_name not in automate["U"]:
+        raise ValueError(f"The input '{u_name}' does not exist in U.")
+    if "Input" not in automate:
+        automate["Input"] = {}  # Creation of the Input dictionary if it does not exist
+    automate["Input"][u_name] = signal
+
+
 def define_event_set(automate, events):
     """Defines the set of observable events"""
     automate["E"] = {e: False for e in events}
@@ -109,7 +122,26 @@ def set_event(automate, q_from, q_to, event_name):
     automate["Event"][q_from][q_to] = event_name
 
 
-def add_transition(automate, q_from, q_to, event=None, guard=None, reset=None):
+def set_rate(automate, q_from, q_to, rate):
+    """
+    Makes the transition from q_from to q_to stochastic: it fires after a random
+    delay following the law rate (see Stochastic.exponential, weibull, intensity),
+    drawn when q_from is entered.
+    """
+    if q_from not in automate["Q"] or q_to not in automate["Q"]:
+        raise ValueError(f"The couple ({q_from}, {q_to}) is not valid in Q × Q.")
+    if "Rate" not in automate:
+        automate["Rate"] = {}  # Creation of the Rate dictionary if it does not exist
+    if q_from not in automate["Rate"]:
+        automate["Rate"][q_from] = {}
+    automate["Rate"][q_from][q_to] = rate
+    # The simulation looks for the outgoing transitions in Guard
+    automate["Guard"].setdefault(q_from, {}).setdefault(q_to, None)
+
+
+def add_transition(
+    automate, q_from, q_to, event=None, guard=None, reset=None, rate=None
+):
     """
     Adds a transition to the automaton with optional guard and reset.
     Parameters:
@@ -118,73 +150,375 @@ def add_transition(automate, q_from, q_to, event=None, guard=None, reset=None):
         event (str): Event label.
         guard (str): Guard function name.
         reset (str): Reset function name.
+        rate (dict): Delay law of a stochastic transition (see set_rate).
     """
-    automate["T"].append(
-        {"q_from": q_from, "q_to": q_to, "event": event, "guard": guard, "reset": reset}
-    )
+    transition = {
+        "q_from": q_from,
+        "q_to": q_to,
+        "event": event,
+        "guard": guard,
+        "reset": reset,
+    }
+    if rate is not None:
+        transition["rate"] = {
+            k: (v.__name__ if callable(v) else v) for k, v in rate.items()
+        }
+    automate["T"].append(transition)
 
 
 # --- Generic function to extract function source code ---
+
+# Source code of the functions already inspected, by code object
+_source_cache = {}
+
+
+def function_source(func):
+    """
+    Returns the source code of a function. Functions sharing the same code object
+    are inspected only once.
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return inspect.getsource(func)
+    source = _source_cache.get(code)
+    if source is None:
+        source = inspect.getsource(func)
+        _source_cache[code] = source
+    return source
+
+
 def collect_functions(*funcs):
     """
     It builds a dictionary of function names to source code strings.
     Only includes callable functions.
     """
-    function_names = [f.__name__ for f in funcs if callable(f)]
     source_map = {}
-    all_items = list(globals().items())
-    for name, func in all_items:
-        if callable(func) and name in function_names:
-            source_map[name] = inspect.getsource(func)
+    for func in funcs:
+        if callable(func) and func.__name__ not in source_map:
+            source_map[func.__name__] = function_source(func)
     return source_map
 
 
+def automate_functions(automate):
+    """Returns the functions (flows, invariants, guards, jumps, rates) used by the automaton"""
+    funcs = list(automate["flow"].values()) + list(automate["Inv"].values())
+    for table in (automate["Guard"], automate["Jump"]):
+        for targets in table.values():
+            funcs.extend(targets.values())
+    for targets in automate.get("Rate", {}).values():
+        funcs.extend(rate.get("func") for rate in targets.values())
+    return funcs
+
+
 # --- Export utility ---
 
 
-def export_automate_to_txt_with_functions(automate, filename, functions_dict):
-    """
-    Exports the automate and associated function source codes to a JSON-formatted .txt file.
-    Parameters:
-        automate (dict): The automaton structure.
-        filename (str): Output file name.
-        functions_dict (dict): Dictionary mapping function names to their source code.
-    """
+def _get_func_name(f):
+    return f.__name__ if callable(f) else None
+
+
+def _encode(value, indent, level):
+    """JSON encoding of a value nested at the given level"""
+    text = json.dumps(value, indent=indent)
+    if indent:
+        text = text.replace("\n", "\n" + " " * (indent * level))
+    return text
+
+
+def _document(automate, functions_dict):
+    """The exported JSON structure of the automaton"""
+    if functions_dict is None:
+        functions_dict = collect_functions(*automate_functions(automate))
 
-    def get_func_name(f):
-        return f.__name__ if callable(f) else None
+    def names(table):
+        return {
+            q1: {q2: _get_func_name(g) for q2, g in t.items()}
+            for q1, t in table.items()
+        }
 
-    data = {
+    return {
         "Q": automate["Q"],
         "X": automate["X"],
         "U": automate["U"],
         "E": automate["E"],
         "q0": automate["q0"],
-        "x0": automate["x0"],
-        "flow": {q: get_func_name(automate["flow"].get(q)) for q in automate["Q"]},
-        "Inv": {q: get_func_name(automate["Inv"].get(q)) for q in automate["Q"]},
-        "Guard": {
-            q1: {
-                q2: get_func_name(automate["Guard"][q1][q2])
-                for q2 in automate["Guard"][q1]
-            }
-            for q1 in automate["Guard"]
-        },
-        "Jump": {
-            q1: {
-                q2: get_func_name(automate["Jump"][q1][q2])
-                for q2 in automate["Jump"][q1]
-            }
-            for q1 in automate["Jump"]
-        },
+        "x0": list(automate["x0"]),
+        "flow": {q: _get_func_name(automate["flow"].get(q)) for q in automate["Q"]},
+        "Inv": {q: _get_func_name(automate["Inv"].get(q)) for q in automate["Q"]},
+        "Guard": names(automate["Guard"]),
+        "Jump": names(automate["Jump"]),
         "T": automate["T"],
         "functions": functions_dict,
     }
+
+
+def _write_container(write, entries, indent, level, brackets="{}"):
+    """
+    Writes a JSON object or list from its entries, given either encoded or as
+    functions writing them.
+    """
+    pad = "\n" + " " * (indent * (level + 1)) if indent else ""
+    write(brackets[0])
+    empty = True
+    for entry in entries:
+        write(pad if empty else "," + (pad or " "))
+        if callable(entry):
+            entry(write)
+        else:
+            write(entry)
+        empty = False
+    if indent and not empty:
+        write("\n" + " " * (indent * level))
+    write(brackets[1])
+
+
+def _fragment(cache, stats, key, signature, encode):
+    """
+    Returns the encoded fragment of an entry, re-encoding it only if its
+    signature changed since the last export.
+    """
+    stats["fragments"] += 1
+    cached = cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    stats["rewritten"] += 1
+    text = encode()
+    cache[key] = (signature, text)
+    return text
+
+
+def stream_automate_to_json(
+    automate, destination, functions_dict=None, indent=None, cache=None
+):
+    """
+    Exports the automaton and its function source codes as JSON, streaming it to
+    the destination instead of building the whole text in memory.
+    Parameters:
+        automate (dict): The automaton structure.
+        destination: Output path or file object.
+        functions_dict (dict): Function names -> source code. By default the
+            sources of the automaton's functions are captured (see collect_functions).
+        indent (int): JSON indentation (None for a compact output).
+        cache (dict): Export cache reused between calls. Only the modes, edges and
+            functions which changed since the previous export are encoded again, and
+            nothing is written if the output file is already up to date.
+    Returns:
+        dict: Number of "fragments" of the document and of "rewritten" ones.
+    """
+    if cache is None:
+        # No incremental export: one streaming pass of the JSON encoder
+        data = _document(automate, functions_dict)
+        count = 6 + sum(len(data[key]) for key in ("flow", "Inv", "Guard", "Jump"))
+        count += len(data["T"]) + len(data["functions"])
+        stats = {"fragments": count, "rewritten": count}
+        chunks = json.JSONEncoder(indent=indent).iterencode(data)
+        if hasattr(destination, "write"):
+            for chunk in chunks:
+                destination.write(chunk)
+            return stats
+        temporary = destination + ".tmp"
+        with open(temporary, "w") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temporary, destination)
+        return stats
+
+    if cache.get("indent", indent) != indent:
+        cache.clear()
+    cache["indent"] = indent
+    fragments = cache.setdefault("fragments", {})
+    stats = {"fragments": 0, "rewritten": 0}
+
+    def entry(key, value, level):
+        return json.dumps(key) + ": " + _encode(value, indent, level)
+
+    def mode_entries(section, table):
+        for q in automate["Q"]:
+            f = table.get(q)
+            yield _fragment(
+                fragments,
+                stats,
+                (section, q),
+                f,
+                lambda: entry(q, _get_func_name(f), 2),
+            )
+
+    def edge_entries(section, table):
+        for q1, targets in table.items():
+            signature = tuple(targets.items())
+            yield _fragment(
+                fragments,
+                stats,
+                (section, q1),
+                signature,
+                lambda: entry(
+                    q1, {q2: _get_func_name(g) for q2, g in targets.items()}, 2
+                ),
+            )
+
+    def transition_entries():
+        for k, t in enumerate(automate["T"]):
+            yield _fragment(
+                fragments,
+                stats,
+                ("T", k),
+                tuple(t.items()),
+                lambda: _encode(t, indent, 2),
+            )
+
+    def function_entries():
+        if functions_dict is not None:
+            for name, source in functions_dict.items():
+                yield _fragment(
+                    fragments,
+                    stats,
+                    ("functions", name),
+                    source,
+                    lambda: entry(name, source, 2),
+                )
+            return
+        seen = set()
+        for f in automate_functions(automate):
+            if callable(f) and f.__name__ not in seen:
+                seen.add(f.__name__)
+                yield _fragment(
+                    fragments,
+                    stats,
+                    ("functions", f.__name__),
+                    f,
+                    lambda: entry(f.__name__, function_source(f), 2),
+                )
+
+    def value_entry(key):
+        value = automate[key]
+        text = _encode(list(value) if key == "x0" else value, indent, 1)
+        return (
+            json.dumps(key)
+            + ": "
+            + _fragment(fragments, stats, (key,), text, lambda: text)
+        )
+
+    def container_entry(key, entries, brackets="{}"):
+        def write_entry(write):
+            write(json.dumps(key) + ": ")
+            _write_container(write, entries, indent, 1, brackets)
+
+        return write_entry
+
+    def document_entries():
+        for key in ("Q", "X", "U", "E", "q0", "x0"):
+            yield value_entry(key)
+        yield container_entry("flow", mode_entries("flow", automate["flow"]))
+        yield container_entry("Inv", mode_entries("Inv", automate["Inv"]))
+        yield container_entry("Guard", edge_entries("Guard", automate["Guard"]))
+        yield container_entry("Jump", edge_entries("Jump", automate["Jump"]))
+        yield container_entry("T", transition_entries(), "[]")
+        yield container_entry("functions", function_entries())
+
+    def write_document(write):
+        _write_container(write, document_entries(), indent, 0)
+
+    if hasattr(destination, "write"):
+        write_document(destination.write)
+        return stats
+
+    # Dry pass: encodes the changed fragments and tells if the file is up to date
+    write_document(lambda chunk: None)
+    report = dict(stats)
+    if (
+        report["rewritten"] == 0
+        and cache.get("path") == destination
+        and cache.get("fragments_count") == report["fragments"]
+        and os.path.exists(destination)
+    ):
+        return report
+    temporary = destination + ".tmp"
+    with open(temporary, "w") as f:
+        write_document(f.write)
+    os.replace(temporary, destination)
+    cache["path"] = destination
+    cache["fragments_count"] = report["fragments"]
+    return report
+
+
+def export_automate_to_txt_with_functions(
+    automate, filename, functions_dict, directory="Thermostat_Results"
+):
+    """
+    Exports the automate and associated function source codes to a JSON-formatted .txt file.
+    Parameters:
+        automate (dict): The automaton structure.
+        filename (str): Output file name.
+        functions_dict (dict): Dictionary mapping function names to their source code.
+        directory (str): Output directory (None to use filename as it is).
+    """
     # Path to the directory Convert_HA_to_HtPN for conversion
-    full_path = os.path.join("Thermostat_Results", filename)
+    full_path = os.path.join(directory, filename) if directory else filename
     # Write the data to a JSON file
-    with open(full_path, "w") as f:
-        f.write(json.dumps(data, indent=4))
+    stream_automate_to_json(automate, full_path, functions_dict, indent=4)
+
+
+# --- Import utility ---
+
+
+def load_automate_from_txt(filename):
+    """
+    Rebuilds an automaton from a file written by export_automate_to_txt_with_functions.
+    The source code of the functions is executed, so only load trusted files.
+    Parameters:
+        filename (str): Path of the exported automaton.
+    Returns:
+        dict: The automaton structure, in its initial state.
+    """
+    with open(filename, "r") as f:
+        data = json.load(f)
+
+    sources = data.get("functions", {})
+    namespace = {}
+    if any("np." in code for code in sources.values()):
+        import numpy as np  # Only imported for the models which use it
+
+        namespace["np"] = np
+    for code in sources.values():
+        exec(code, namespace)
+    for name, code in sources.items():
+        # The loaded functions have no source file: their source is the exported one
+        if hasattr(namespace.get(name), "__code__"):
+            _source_cache[namespace[name].__code__] = code
+
+    def func(name):
+        if name is None:
+            return None
+        if name not in namespace:
+            raise ValueError(f"The source of the function '{name}' is missing.")
+        return namespace[name]
+
+    automate = create_automate()
+    automate["Q"] = data["Q"][:]
+    automate["X"] = data["X"][:]
+    automate["U"] = data.get("U", [])[:]
+    automate["E"] = dict(data.get("E", {}))
+    set_initial_state(automate, data["q0"], data["x0"])
+    for section in ("flow", "Inv"):
+        for q, name in data.get(section, {}).items():
+            if name is not None:
+                automate[section][q] = func(name)
+    for section in ("Guard", "Jump"):
+        for q1, targets in data.get(section, {}).items():
+            for q2, name in targets.items():
+                automate[section].setdefault(q1, {})[q2] = func(name)
+    for t in data.get("T", []):
+        q1, q2 = t["q_from"], t["q_to"]
+        if t.get("event") is not None:
+            set_event(automate, q1, q2, t["event"])
+        if t.get("rate") is not None:
+            rate = {
+                k: namespace.get(v, v) if k == "func" else v
+                for k, v in t["rate"].items()
+            }
+            set_rate(automate, q1, q2, rate)
+        automate["T"].append(dict(t))
+    return automate
 
 
 # --- Generation of HtPN configuration ---
@@ -0,0 +1,121 @@
+from bisect import bisect_right
+
+"""
+Tabulated input signals for the input space U of a hybrid automaton.
+A signal is a time series (times, values) evaluated with a zero-order-hold
+("zoh") or a linear interpolation. The samples can be any indexable sequence
+(list, array.array, numpy array or numpy.memmap), so very long recordings do
+not have to be loaded in memory.
+"""
+
+INTERPOLATIONS = ("zoh", "linear")
+
+# Beyond this number of samples the cursor stops scanning and uses a bisection
+_MAX_SCAN = 8
+
+
+def create_input_signal(times, values, interpolation="zoh"):
+    """
+    Creates an input signal from tabulated samples.
+    Parameters:
+        times (sequence): Sample times, sorted in increasing order.
+        values (sequence): Sample values, same length as times.
+        interpolation (str): "zoh" (zero-order-hold) or "linear".
+    Returns:
+        dict: The input signal structure.
+    """
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(f"Unknown interpolation '{interpolation}'.")
+    if len(times) == 0:
+        raise ValueError("An input signal needs at least one sample.")
+    if len(times) != len(values):
+        raise ValueError("times and values must have the same length.")
+    return {
+        "t": times,  # Sample times
+        "u": values,  # Sample values
+        "interpolation": interpolation,
+        "cursor": 0,  # Index of the last sample with t_i <= t
+    }
+
+
+def load_input_signal(path, interpolation="zoh"):
+    """
+    Loads a signal saved with numpy.save as an array of shape (N, 2) whose
+    columns are (time, value). The file is memory-mapped, not read.
+    """
+    import numpy as np
+
+    samples = np.load(path, mmap_mode="r")
+    if samples.ndim != 2 or samples.shape[1] != 2:
+        raise ValueError("The signal file must contain an array of shape (N, 2).")
+    return create_input_signal(samples[:, 0], samples[:, 1], interpolation)
+
+
+def reset_input_signal(signal):
+    """Moves the cursor of the signal back to the first sample"""
+    signal["cursor"] = 0
+
+
+def _locate(times, t, i):
+    """
+    Returns the index of the last sample with times[i] <= t (0 if t is before
+    the first sample), starting the search from the index i.
+    """
+    n = len(times)
+    if t < times[i]:
+        return max(bisect_right(times, t) - 1, 0)
+    for _ in range(_MAX_SCAN):
+        if i + 1 >= n or times[i + 1] > t:
+            return i
+        i += 1
+    return bisect_right(times, t, lo=i) - 1
+
+
+def _interpolate(signal, t, i):
+    times = signal["t"]
+    values = signal["u"]
+    if signal["interpolation"] == "zoh" or i + 1 >= len(times) or t <= times[i]:
+        return float(values[i])
+    t0, t1 = times[i], times[i + 1]
+    u0, u1 = values[i], values[i + 1]
+    return float(u0 + (u1 - u0) * (t - t0) / (t1 - t0))
+
+
+def input_value(signal, t):
+    """
+    Evaluates the signal at time t. The cursor of the signal is moved to t, so
+    evaluating the signal at increasing times costs O(1) per call.
+    """
+    i = _locate(signal["t"], t, signal["cursor"])
+    signal["cursor"] = i
+    return _interpolate(signal, t, i)
+
+
+def input_values(signal, times):
+    """
+    Evaluates the signal at many times at once (e.g. for an ensemble of runs).
+    Uses numpy when it is available, otherwise walks the samples with a local
+    cursor. The cursor of the signal is left untouched.
+    Returns:
+        list or numpy.ndarray: The values of the signal at the given times.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is None:
+        result = []
+        i = 0
+        for t in times:
+            i = _locate(signal["t"], t, i)
+            result.append(_interpolate(signal, t, i))
+        return result
+
+    ts = np.asarray(signal["t"], dtype=float)
+    us = np.asarray(signal["u"], dtype=float)
+    query = np.asarray(times, dtype=float)
+    if signal["interpolation"] == "linear":
+        return np.interp(query, ts, us)
+    idx = np.searchsorted(ts, query, side="right") - 1
+    return us[np.clip(idx, 0, len(ts) - 1)]
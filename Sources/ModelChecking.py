@@ -0,0 +1,254 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from Simulation import simulate
+
+"""
+Statistical model checking of hybrid automata.
+A run is a function run(rng) -> trace which draws its randomness (initial
+state, event schedule, parameters, ...) from the random.Random given, and seeds
+the stochastic transitions from it too (simulate(..., rng=rng.getrandbits(63))).
+A predicate maps a trace to True/False. The samples are seeded from their index,
+so the results do not depend on the number of worker processes. With workers > 1
+the run and the predicate must be picklable (module-level functions or partial).
+"""
+
+METHODS = ("clopper-pearson", "chernoff")
+
+
+# --- Runs and predicates ---
+
+
+def _randomized_run(factory, dt, t_max, sample_params, sample_x0, sample_schedule, rng):
+    params = sample_params(rng) if sample_params else {}
+    A = factory(params)
+    if sample_x0:
+        A["x"] = list(sample_x0(rng))
+    schedule = sample_schedule(rng) if sample_schedule else None
+    # The stochastic transitions draw from a stream seeded by the sample
+    return simulate(
+        A, dt=dt, t_max=t_max, event_schedule=schedule, rng=rng.getrandbits(63)
+    )
+
+
+def randomized_run(
+    factory, dt, t_max, sample_params=None, sample_x0=None, sample_schedule=None
+):
+    """
+    Builds a run simulating an automaton with randomized inputs.
+    Parameters:
+        factory: Function params(dict) -> automaton, building a fresh automaton.
+        dt, t_max: Simulation step and horizon.
+        sample_params: Function rng -> dict of parameters given to the factory.
+        sample_x0: Function rng -> initial continuous state.
+        sample_schedule: Function rng -> event schedule.
+    """
+    return partial(
+        _randomized_run, factory, dt, t_max, sample_params, sample_x0, sample_schedule
+    )
+
+
+def _enters_within(q, t_bound, trace):
+    return any(t <= t_bound and state == q for t, state, _ in trace)
+
+
+def enters_within(q, t_bound):
+    """Predicate: the discrete state q is reached before the time t_bound"""
+    return partial(_enters_within, q, t_bound)
+
+
+# --- Sampling ---
+
+
+def _sample_seed(seed, index):
+    return seed * 2**32 + index
+
+
+def _evaluate(run, predicate, seed):
+    return bool(predicate(run(random.Random(seed))))
+
+
+def _samples(run, predicate, seed, max_samples, workers, batch_size):
+    """Yields the verdicts of the samples 0, 1, ... in order"""
+    if workers <= 1:
+        for i in range(max_samples):
+            yield _evaluate(run, predicate, _sample_seed(seed, i))
+        return
+    batch_size = batch_size or 4 * workers
+    evaluate = partial(_evaluate, run, predicate)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for start in range(0, max_samples, batch_size):
+            stop = min(start + batch_size, max_samples)
+            seeds = [_sample_seed(seed, i) for i in range(start, stop)]
+            yield from executor.map(evaluate, seeds)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+# --- Confidence bounds ---
+
+
+def chernoff_sample_size(epsilon, delta):
+    """
+    Number of samples after which the Chernoff-Hoeffding bound guarantees
+    P(|p_hat - p| > epsilon) <= delta.
+    """
+    return math.ceil(math.log(2.0 / delta) / (2.0 * epsilon**2))
+
+
+def _beta_cf(a, b, x):
+    """Continued fraction of the incomplete beta function (modified Lentz)"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 500):
+        for num in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + num * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + num / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _beta_cdf(x, a, b):
+    """Regularized incomplete beta function I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = (
+        math.lgamma(a + b)
+        - math.lgamma(a)
+        - math.lgamma(b)
+        + a * math.log(x)
+        + b * math.log1p(-x)
+    )
+    if x < (a + 1.0) / (a + b + 2.0):
+        return math.exp(log_front) * _beta_cf(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _beta_cf(b, a, 1.0 - x) / b
+
+
+def _beta_quantile(p, a, b):
+    lo, hi = 0.0, 1.0
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        if _beta_cdf(mid, a, b) < p:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5 * (lo + hi)
+
+
+def clopper_pearson(successes, samples, delta):
+    """Exact (Clopper-Pearson) confidence interval of level 1 - delta"""
+    k, n = successes, samples
+    lower = 0.0 if k == 0 else _beta_quantile(delta / 2.0, k, n - k + 1)
+    upper = 1.0 if k == n else _beta_quantile(1.0 - delta / 2.0, k + 1, n - k)
+    return lower, upper
+
+
+# --- Statistical tests ---
+
+
+def estimate_probability(
+    run,
+    predicate,
+    epsilon=0.01,
+    delta=0.05,
+    method="clopper-pearson",
+    seed=0,
+    workers=1,
+    batch_size=None,
+):
+    """
+    Estimates the probability that a run satisfies the predicate.
+    Parameters:
+        run: Function rng -> trace (see randomized_run).
+        predicate: Function trace -> bool (see enters_within).
+        epsilon: Half-width of the requested confidence interval.
+        delta: 1 - confidence level.
+        method: "clopper-pearson" stops as soon as the exact interval is narrower
+            than 2 * epsilon, "chernoff" draws the Chernoff-Hoeffding sample size.
+            Both never draw more than the Chernoff-Hoeffding sample size.
+        seed: Seed of the sample streams.
+        workers: Number of worker processes.
+        batch_size: Samples submitted at once to the workers.
+    Returns:
+        dict: probability, interval (lower, upper), samples and successes.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}'.")
+    if not (0.0 < epsilon < 1.0 and 0.0 < delta < 1.0):
+        raise ValueError("epsilon and delta must lie in ]0, 1[.")
+    max_samples = chernoff_sample_size(epsilon, delta)
+
+    n = k = 0
+    interval = (0.0, 1.0)
+    for verdict in _samples(run, predicate, seed, max_samples, workers, batch_size):
+        n += 1
+        k += verdict
+        if method == "clopper-pearson":
+            interval = clopper_pearson(k, n, delta)
+            if interval[1] - interval[0] <= 2.0 * epsilon:
+                break
+    p_hat = k / n
+    if method == "chernoff":
+        interval = (max(p_hat - epsilon, 0.0), min(p_hat + epsilon, 1.0))
+    return {"probability": p_hat, "interval": interval, "samples": n, "successes": k}
+
+
+def sprt(
+    run,
+    predicate,
+    theta,
+    indifference=0.01,
+    alpha=0.05,
+    beta=0.05,
+    max_samples=100000,
+    seed=0,
+    workers=1,
+    batch_size=None,
+):
+    """
+    Tests whether the probability p that a run satisfies the predicate is at
+    least theta with Wald's sequential probability ratio test, between
+    H0: p >= theta + indifference and H1: p <= theta - indifference.
+    Parameters:
+        alpha, beta: Probabilities of wrongly rejecting H0 and H1.
+        max_samples: Maximal number of samples before giving up.
+    Returns:
+        dict: verdict (True if H0 is accepted, False if H1 is accepted, None if
+        undecided after max_samples), samples and successes.
+    """
+    p0, p1 = theta + indifference, theta - indifference
+    if not (0.0 < p1 < p0 < 1.0):
+        raise ValueError("theta +/- indifference must lie in ]0, 1[.")
+    accept_h1 = math.log((1.0 - beta) / alpha)
+    accept_h0 = math.log(beta / (1.0 - alpha))
+    step_success = math.log(p1 / p0)
+    step_failure = math.log((1.0 - p1) / (1.0 - p0))
+
+    n = k = 0
+    ratio = 0.0
+    verdict = None
+    for success in _samples(run, predicate, seed, max_samples, workers, batch_size):
+        n += 1
+        k += success
+        ratio += step_success if success else step_failure
+        if ratio >= accept_h1:
+            verdict = False
+            break
+        if ratio <= accept_h0:
+            verdict = True
+            break
+    return {"verdict": verdict, "samples": n, "successes": k}
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import types
+from array import array
+from bisect import bisect_left
+from functools import partial
+
+from HybridAutomaton import function_source
+from Simulation import simulate
+from Trace import Trace
+from TraceWriter import TraceWriter, read_trace
+
+"""
+On-disk cache of simulation results.
+A run is identified by a hash of everything simulate depends on: the structure
+(Q, X, U, T, events), the source code of the flows, guards, resets and rates
+(with their default arguments, closure variables and global constants), the
+current state (q, x, E), the input signals, dt, the event schedule and the seed.
+The horizon t_max is not part of the key: one trace is kept per run, the
+longest one. A shorter horizon is answered by truncating it, and a longer one by
+resuming the simulation from its last sample.
+Traces are stored compressed (see TraceWriter.py) and evicted in least recently
+used order when the cache exceeds max_bytes.
+Runs with stochastic transitions are only cached when rng is an int seed, and
+are never resumed (the random stream cannot be restored).
+"""
+
+INDEX_FILE = "index.json"
+
+_PLAIN = (bool, int, float, complex, str, bytes, type(None))
+
+
+def _fingerprint(value, seen):
+    """
+    Returns a stable text describing a value (functions by their code, numeric
+    arrays by a hash of their bytes)
+    """
+    if isinstance(value, _PLAIN):
+        return repr(value)
+    if isinstance(value, partial):
+        parts = (value.func, value.args, value.keywords)
+        return "partial" + _fingerprint(parts, seen)
+    if isinstance(value, types.FunctionType):
+        code = value.__code__
+        if code in seen:  # Recursive functions
+            return f"<{code.co_name}>"
+        seen.add(code)
+        try:
+            source = function_source(value)
+        except (OSError, TypeError):  # Source not available
+            source = code.co_code.hex() + repr(code.co_names)
+        parts = [source, _fingerprint(value.__defaults__, seen)]
+        for cell in value.__closure__ or ():
+            try:
+                parts.append(_fingerprint(cell.cell_contents, seen))
+            except ValueError:  # Empty cell
+                parts.append("<empty>")
+        # Global constants and helper functions used by the function
+        namespace = value.__globals__
+        for name in code.co_names:
+            if name in namespace and not isinstance(namespace[name], types.ModuleType):
+                parts.append(f"{name}={_fingerprint(namespace[name], seen)}")
+        return "function(" + "|".join(parts) + ")"
+    if isinstance(value, dict):
+        items = sorted(
+            (_fingerprint(k, seen), _fingerprint(v, seen)) for k, v in value.items()
+        )
+        return "{" + ",".join(f"{k}:{v}" for k, v in items) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_fingerprint(v, seen) for v in value) + "]"
+    if isinstance(value, array):
+        return f"array({value.typecode},{_digest(value)})"
+    if hasattr(value, "tolist"):  # numpy arrays and memory maps
+        import numpy as np
+
+        data = np.ascontiguousarray(value)
+        if data.dtype.hasobject:
+            return _fingerprint(value.tolist(), seen)
+        return f"ndarray({data.dtype.str},{np.shape(value)},{_digest(data)})"
+    return repr(value)
+
+
+def _digest(buffer):
+    """Hash of the bytes of a contiguous buffer, without converting its items"""
+    return hashlib.sha256(memoryview(buffer)).hexdigest()
+
+
+def run_key(A, dt, event_schedule=None, rng=None):
+    """Returns the hash identifying the runs of A, for any horizon"""
+    inputs = {
+        u: (signal["t"], signal["u"], signal["interpolation"])
+        for u, signal in A.get("Input", {}).items()
+    }
+    description = {
+        "Q": A["Q"],
+        "X": A["X"],
+        "U": A["U"],
+        "T": A["T"],
+        "q": A["q"],
+        "x": A["x"],
+        "E": A["E"],
+        "flow": A["flow"],
+        "Guard": A["Guard"],
+        "Jump": A["Jump"],
+        "Event": A.get("Event", {}),
+        "Rate": A.get("Rate", {}),
+        "Input": inputs,
+        "dt": dt,
+        "schedule": sorted(event_schedule or [], key=lambda e: e[0]),
+        "rng": rng,
+    }
+    text = _fingerprint(description, set())
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _prefix(trace, t_max):
+    """Returns the samples of a longer run which a run up to t_max would produce"""
+    end = bisect_left(trace.t, t_max) + 1  # First sample reaching t_max
+    if end >= len(trace):
+        return trace
+    codes = trace.codes[:end]
+    prefix = Trace(trace.names)
+    for q in trace.modes[: max(codes) + 1]:  # Modes are numbered by first appearance
+        prefix.mode_code(q)
+    prefix.extend(trace.t[:end], codes, [column[:end] for column in trace.x])
+    return prefix
+
+
+def _resume(A, trace, dt, t_max, event_schedule):
+    """Extends a trace of A up to t_max by simulating from its last sample"""
+    schedule = sorted(event_schedule or [], key=lambda e: e[0])
+    last_step = trace.t[-2]  # The events are applied at the beginning of each step
+    applied = 0
+    while applied < len(schedule) and schedule[applied][0] <= last_step:
+        applied += 1
+    t_last, q_last, x_last = trace[-1]
+    B = dict(A)
+    B["q"], B["x"] = q_last, list(x_last)
+    B["E"] = dict(A["E"])
+    for _, name, value in schedule[:applied]:
+        B["E"][name] = value
+    rest = simulate(B, dt, t_max, schedule[applied:], t0=t_last)
+    mapping = [trace.mode_code(q) for q in rest.modes]
+    trace.extend(
+        rest.t[1:],
+        array("i", (mapping[code] for code in rest.codes[1:])),
+        [column[1:] for column in rest.x],
+    )
+    return trace
+
+
+class ResultCache:
+    """
+    Memoizes simulate on disk.
+    Parameters:
+        directory: Directory of the cached traces (created if needed).
+        max_bytes: Maximum size of the cached traces.
+    Attributes:
+        hits, extended, misses: Runs answered from the cache, by resuming a
+            cached run, and by a full simulation.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.extended = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, INDEX_FILE), "r") as f:
+                self._index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._index = {"clock": 0, "entries": {}}
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.hat")
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._index, f)
+        os.replace(path + ".tmp", path)
+
+    def _touch(self, entry):
+        self._index["clock"] += 1
+        entry["used"] = self._index["clock"]
+
+    def _load(self, key):
+        try:
+            return read_trace(self._path(key))
+        except (OSError, ValueError):  # Deleted or damaged file
+            self._index["entries"].pop(key, None)
+            return None
+
+    def _store(self, key, t_max, trace):
+        path = self._path(key)
+        with TraceWriter(path + ".tmp", trace.names) as writer:
+            writer.write(trace)
+        os.replace(path + ".tmp", path)
+        entry = {"t_max": t_max, "size": os.path.getsize(path), "summaries": {}}
+        self._index["entries"][key] = entry
+        self._touch(entry)
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        entries = self._index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries.pop(key)["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _cacheable(self, A, rng):
+        return not A.get("Rate") or isinstance(rng, int)
+
+    def simulate(self, A, dt=0.01, t_max=10.0, event_schedule=None, rng=None):
+        """
+        Returns the trace of simulate(A, dt, t_max, event_schedule, rng=rng),
+        from the cache when possible. A is not modified.
+        """
+        if not self._cacheable(A, rng):
+            self.misses += 1
+            return simulate(A, dt, t_max, event_schedule, rng=rng)
+        key = run_key(A, dt, event_schedule, rng)
+        entry = self._index["entries"].get(key)
+        trace = self._load(key) if entry is not None else None
+        if trace is not None and entry["t_max"] >= t_max:
+            self.hits += 1
+            self._touch(entry)
+            self._save_index()
+            return _prefix(trace, t_max)
+
+        if trace is not None and len(trace) > 1 and not A.get("Rate"):
+            self.extended += 1
+            trace = _resume(A, trace, dt, t_max, event_schedule)
+        else:
+            self.misses += 1
+            B = dict(A, E=dict(A["E"]))  # simulate updates q, x and E
+            trace = simulate(B, dt, t_max, event_schedule, rng=rng)
+        self._store(key, t_max, trace)
+        return trace
+
+    def summary(self, A, dt=0.01, t_max=10.0, event_schedule=None, rng=None):
+        """Returns the summary of the run (see ha.summarize), cached with its trace"""
+        from ha import summarize
+
+        if not self._cacheable(A, rng):
+            return summarize(self.simulate(A, dt, t_max, event_schedule, rng))
+        key = run_key(A, dt, event_schedule, rng)
+        entry = self._index["entries"].get(key)
+        if entry is not None and repr(t_max) in entry["summaries"]:
+            self.hits += 1
+            self._touch(entry)
+            self._save_index()
+            return entry["summaries"][repr(t_max)]
+        result = summarize(self.simulate(A, dt, t_max, event_schedule, rng))
+        entry = self._index["entries"].get(key)
+        if entry is not None:
+            entry["summaries"][repr(t_max)] = result
+            self._save_index()
+        return result
+
+    def clear(self):
+        """Removes every cached run"""
+        for key in list(self._index["entries"]):
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        self._index = {"clock": 0, "entries": {}}
+        self._save_index()
@@ -0,0 +1,226 @@
+import copy
+import math
+from collections import deque
+from functools import partial
+
+"""
+Online monitoring of Signal Temporal Logic (STL) requirements.
+A formula is built from atoms (robustness functions of (q, x)), boolean
+connectives and bounded temporal operators. Every node receives the samples of
+the simulation one by one and outputs the robustness at each sample time as soon
+as it is known: atoms immediately, temporal operators once their time window is
+complete. The windows of Eventually/Always are sliding min/max computed with
+monotonic deques, so the memory is bounded by the window length.
+
+Example ("whenever in Q2, tau stays below 3 and x reaches 10 within 4 s"):
+    STLMonitor(Implies(in_mode("Q2"), And(less(1, 3.0), Eventually(0.0, 4.0, greater(0, 10.0)))))
+"""
+
+
+# --- Formula nodes ---
+
+
+class Atom:
+    """Atomic proposition whose robustness at a sample is func(q, x)"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def push(self, t, q, x):
+        return [(t, float(self.func(q, x)))]
+
+    def close(self):
+        return []
+
+
+def _greater(i, c, q, x):
+    return x[i] - c
+
+
+def _less(i, c, q, x):
+    return c - x[i]
+
+
+def _in_mode(mode, q, x):
+    return math.inf if q == mode else -math.inf
+
+
+def greater(i, c):
+    """Atom x[i] >= c"""
+    return Atom(partial(_greater, i, c))
+
+
+def less(i, c):
+    """Atom x[i] <= c"""
+    return Atom(partial(_less, i, c))
+
+
+def in_mode(mode):
+    """Atom q == mode (robustness +inf or -inf)"""
+    return Atom(partial(_in_mode, mode))
+
+
+class Not:
+    def __init__(self, phi):
+        self.phi = phi
+
+    def push(self, t, q, x):
+        return [(ti, -rho) for ti, rho in self.phi.push(t, q, x)]
+
+    def close(self):
+        return [(ti, -rho) for ti, rho in self.phi.close()]
+
+
+class And:
+    """Conjunction: minimum of the robustness of the operands"""
+
+    combine = staticmethod(min)
+
+    def __init__(self, *phis):
+        self.phis = phis
+        self.queues = [deque() for _ in phis]
+
+    def _merge(self):
+        out = []
+        while all(self.queues):
+            values = [queue.popleft() for queue in self.queues]
+            out.append((values[0][0], self.combine(rho for _, rho in values)))
+        return out
+
+    def push(self, t, q, x):
+        for phi, queue in zip(self.phis, self.queues):
+            queue.extend(phi.push(t, q, x))
+        return self._merge()
+
+    def close(self):
+        for phi, queue in zip(self.phis, self.queues):
+            queue.extend(phi.close())
+        return self._merge()
+
+
+class Or(And):
+    """Disjunction: maximum of the robustness of the operands"""
+
+    combine = staticmethod(max)
+
+
+def Implies(phi, psi):
+    """phi -> psi, i.e. (not phi) or psi"""
+    return Or(Not(phi), psi)
+
+
+class Eventually:
+    """
+    F[a, b] phi: maximum of the robustness of phi over the window [t + a, t + b].
+    At the end of the run the window is truncated; an empty window gives -inf.
+    """
+
+    empty = -math.inf
+
+    def __init__(self, a, b, phi):
+        if not 0.0 <= a <= b < math.inf:
+            raise ValueError("The time window must satisfy 0 <= a <= b < inf.")
+        self.a, self.b, self.phi = a, b, phi
+        self.pending = deque()  # Times whose robustness is not known yet
+        self.incoming = deque()  # Values of phi not yet in the window
+        self.window = deque()  # Monotonic deque of (time, value)
+        self.last = -math.inf  # Time of the last value of phi
+
+    def dominates(self, v, w):
+        return v >= w
+
+    def _receive(self, values):
+        for ti, rho in values:
+            self.pending.append(ti)
+            self.incoming.append((ti, rho))
+            self.last = ti
+
+    def _drain(self, final):
+        out = []
+        while self.pending:
+            t = self.pending[0]
+            if not final and self.last < t + self.b:
+                break
+            while self.incoming and self.incoming[0][0] <= t + self.b:
+                item = self.incoming.popleft()
+                while self.window and self.dominates(item[1], self.window[-1][1]):
+                    self.window.pop()
+                self.window.append(item)
+            while self.window and self.window[0][0] < t + self.a:
+                self.window.popleft()
+            out.append((t, self.window[0][1] if self.window else self.empty))
+            self.pending.popleft()
+        return out
+
+    def push(self, t, q, x):
+        self._receive(self.phi.push(t, q, x))
+        return self._drain(False)
+
+    def close(self):
+        self._receive(self.phi.close())
+        return self._drain(True)
+
+
+class Always(Eventually):
+    """
+    G[a, b] phi: minimum of the robustness of phi over the window [t + a, t + b].
+    At the end of the run the window is truncated; an empty window gives +inf.
+    """
+
+    empty = math.inf
+
+    def dominates(self, v, w):
+        return v <= w
+
+
+# --- Monitor ---
+
+
+class STLMonitor:
+    """
+    Monitors a formula along a run (see the monitors parameter of simulate).
+    With globally=True the requirement is G(formula) over the whole run: the
+    robustness is the minimum over all the sample times and the verdict is False
+    as soon as it becomes negative. Otherwise the requirement is the formula at
+    the first sample, decided as soon as its robustness is known.
+    Attributes:
+        robustness (float): Robustness known so far (an upper bound if globally).
+        verdict (bool or None): None while the requirement is undecided.
+    """
+
+    def __init__(self, formula, globally=True):
+        self.formula = copy.deepcopy(formula)  # Each monitor has its own windows
+        self.globally = globally
+        self.robustness = math.inf
+        self.verdict = None
+        self.decided_at = None
+
+    def _process(self, outputs, t):
+        if self.verdict is not None:
+            return
+        for _, rho in outputs:
+            if not self.globally:
+                self.robustness = rho
+                self.verdict = rho >= 0.0
+                self.decided_at = t
+                return
+            self.robustness = min(self.robustness, rho)
+            if self.robustness < 0.0:
+                self.verdict = False
+                self.decided_at = t
+                return
+
+    def update(self, t, q, x):
+        """Feeds the sample (t, q, x). Returns the verdict (None if undecided)"""
+        if self.verdict is None:
+            self._process(self.formula.push(t, q, x), t)
+        return self.verdict
+
+    def finish(self, t=None):
+        """Ends the run: flushes the pending windows and settles the verdict"""
+        if self.verdict is None:
+            self._process(self.formula.close(), t)
+        if self.verdict is None:
+            self.verdict = self.robustness >= 0.0
+            self.decided_at = t
+        return self.verdict
@@ -1,7 +1,149 @@
-import matplotlib.pyplot as plt
+import dis
+import math
+from bisect import bisect_left
+from collections import deque
 
+from InputSignal import input_value, reset_input_signal
+from Stochastic import RandomStream, schedule_stochastic, stochastic_fires
+from Trace import Trace
 
-def simulate(A, dt=0.01, t_max=10.0, event_schedule=None):
+
+def _input_signals(A):
+    """Returns the input signals ordered as U, or None if the automaton has no inputs"""
+    inputs = A.get("Input", {})
+    if not inputs:
+        return None
+    missing = [u for u in A["U"] if u not in inputs]
+    if missing:
+        raise ValueError(f"No signal is set for the inputs {missing}.")
+    return [inputs[u] for u in A["U"]]
+
+
+# Number of states recorded per discrete state for the cycle detection
+CYCLE_MEMORY = 32
+
+
+def _same_state(x, y, tol):
+    return all(abs(a - b) <= tol * (1.0 + abs(b)) for a, b in zip(x, y))
+
+
+def _steps_until(t, dt, t_stop):
+    """
+    Returns (k, t_k): the number of steps k after which the time of the stepping
+    loop (t += dt at each step, with its rounding) reaches t_stop, and the time
+    t_k reached. In the binade [2^(e-1), 2^e[ of t every addition rounds dt to
+    the same multiple of the spacing of the floats, so the steps are counted in
+    closed form, one binade at a time.
+    """
+    k = 0
+    while t < t_stop:
+        spacing = math.ulp(t)
+        ratio = dt / spacing
+        increment = (t + dt) - t  # Exact
+        if t <= 0.0 or increment <= 0.0 or ratio - math.floor(ratio) == 0.5:
+            t += dt  # Rounding ties (or t <= 0): one plain step
+            k += 1
+            continue
+        base, unit = int(t / spacing), int(increment / spacing)
+        end = int(math.ldexp(1.0, math.frexp(t)[1]) / spacing)  # End of the binade
+        n = (end - 1 - base) // unit  # Steps staying in the binade
+        if n <= 0:
+            t += dt
+            k += 1
+            continue
+        j = max(1, math.ceil((t_stop - t) / increment))
+        if j <= n + 1:
+            while j > 1 and (base + (j - 1) * unit) * spacing >= t_stop:
+                j -= 1
+            while j <= n and (base + j * unit) * spacing < t_stop:
+                j += 1
+            if j <= n:
+                return k + j, (base + j * unit) * spacing
+        t = (base + n * unit) * spacing
+        k += n
+    return k, t
+
+
+def _tail_samples(trace, start, t_max):
+    """Number of samples repeating the cycle from start to the end of the trace up to t_max"""
+    times = trace.t
+    end = len(times) - 1
+    period = times[end] - times[start]
+    remaining = t_max - times[end]
+    if remaining <= 0:
+        return 0
+    offsets = [times[start + o] - times[start] for o in range(end - start)]
+    cycles = int(remaining // period)
+    o = bisect_left(offsets, remaining - cycles * period)
+    if o == len(offsets):
+        cycles, o = cycles + 1, 0
+    return cycles * (end - start) + o
+
+
+_constant_codes = {}  # Code object -> the flow is constant
+
+
+def is_constant_flow(func):
+    """
+    Tells if a flow is constant: its code reads neither its arguments nor any
+    variable (e.g. return [0.0, 0.0]).
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return False
+    constant = _constant_codes.get(code)
+    if constant is None:
+        constant = not (
+            code.co_names or code.co_freevars or code.co_cellvars
+        ) and not any(
+            i.opname.startswith("LOAD_FAST")
+            or i.opname in ("LOAD_DEREF", "LOAD_CLASSDEREF")
+            for i in dis.get_instructions(code)
+        )
+        _constant_codes[code] = constant
+    return constant
+
+
+def _idle_steps(A, q, x, t, dt, t_stop, clocks, u):
+    """
+    Returns (n, t_n, dx): the number of steps from t during which q cannot be
+    left, the time reached (rounded as by the stepping loop) and the constant
+    flow of q, when it is constant. A guard can only be crossed when x moves,
+    events only change at the scheduled times (t_stop) and the stochastic
+    transitions fire at their clocks.
+    """
+    flow = A["flow"][q]
+    if not is_constant_flow(flow):
+        return 0, t, None
+    dx = flow(x, t, u) if u is not None else flow(x, t)
+    moving = any(v != 0 for v in dx)
+    for q2, guard in A["Guard"].get(q, {}).items():
+        if callable(guard) and (moving or guard(x)):
+            return 0, t, None
+        event = A.get("Event", {}).get(q, {}).get(q2)
+        if event and A["E"].get(event, False):
+            return 0, t, None
+    if clocks:
+        t_stop = min(t_stop, min(clocks.values()))
+    steps, t_next = _steps_until(t, dt, t_stop)
+    return steps, t_next, dx
+
+
+def simulate(
+    A,
+    dt=0.01,
+    t_max=10.0,
+    event_schedule=None,
+    monitors=None,
+    stop_when_decided=True,
+    rng=None,
+    detect_cycles=False,
+    cycle_tol=1e-9,
+    writer=None,
+    t0=0.0,
+    fast_forward=False,
+    observer=None,
+):
     """
     This functions simulate the evolution of a hybrid automaton over time.
 
@@ -10,56 +152,177 @@ def simulate(A, dt=0.01, t_max=10.0, event_schedule=None):
         dt(float) : Time step for numerical integration
         t_max : Maximum simulation time
         event_schedule: Tuple of (time,event,value(TRUE/FALSE)) which represent a list of timed events
+        monitors: List of online monitors (see STLMonitor.py) updated at each step
+        stop_when_decided: Stops the simulation as soon as every monitor has a verdict
+        rng: RandomStream (or seed) drawing the delays of the stochastic transitions
+        writer: TraceWriter (see TraceWriter.py) receiving the samples by chunks
+            during the simulation, to write them from a background thread
+        t0: Initial time (e.g. to resume a run from its last sample)
+        fast_forward: Skips the idle periods (see below)
+        observer: Object notified of each step, observer.step(t, q, x, u, dx)
+            before x moves by dx * dt, and of each transition,
+            observer.jump(t, q, q2, x, x_new, u, guard) where guard tells if the
+            guard triggered it (e.g. the sensitivities, see Sensitivity.py)
+
+    If signals are set on the input space U (see set_input), the flows are called
+    as flow(x, t, u) where u holds the input values at time t.
+    The stochastic transitions (see set_rate) fire at a random time drawn when
+    their origin state is entered.
+    With detect_cycles, the state (q, x) reached by each transition is compared
+    with the previous ones (relative tolerance cycle_tol). When it repeats, the
+    run has entered a limit cycle and the rest of the horizon is extrapolated
+    by repeating the cycle (see Trace.repeat_cycle and transition_log) instead
+    of being simulated. The flows must then not depend on t. The detection is
+    disabled with inputs, stochastic transitions, monitors or an observer, and
+    starts once every scheduled event has been applied.
+    With fast_forward, the steps spent in a mode with a constant flow (see
+    is_constant_flow) that cannot be left before the next scheduled event or
+    stochastic firing time are skipped. This happens when its flow is zero and
+    its guards are false, or when it has no guard. The skipped
+    segment is recorded by its last sample only (x is linear in between), and t
+    jumps to the time the stepping would reach, rounding included, so the
+    transitions happen at the same times. It is disabled with monitors or an
+    observer.
 
     Returns:
-        list of tuples (time, discreate_state, continuous_state)
+        Trace: sequence of tuples (time, discreate_state, continuous_state), stored
+        column by column (see Trace.py)
     """
-    t = 0.0
+    t = t0
     q = A["q"]
     x = A["x"][:]
-    trace = [(t, q, x[:])]
+    trace = Trace(A["X"])
+    trace.append(t, q, x)
+    written = 0  # Samples handed to the writer
+
+    def record(t, q, x):
+        nonlocal written
+        trace.append(t, q, x)
+        if writer is not None and len(trace) - written >= writer.chunk_size:
+            writer.write(trace, written)
+            written = len(trace)
+
+    monitors = monitors or []
+    for monitor in monitors:
+        monitor.update(t, q, x)
 
     event_schedule = sorted(event_schedule or [], key=lambda e: e[0])
     current_event_index = 0
 
-    while t < t_max:
-        # Apply programmed events
-        while (
-            current_event_index < len(event_schedule)
-            and t >= event_schedule[current_event_index][0]
-        ):
-            _, name, value = event_schedule[current_event_index]
-            A["E"][name] = value
-            current_event_index += 1
-
-        # Flow
-        dx = A["flow"][q](x, t)
-        x = [x[i] + dx[i] * dt for i in range(len(x))]
-
-        # Try to activate transition
-        # transitioned = False
-        if q in A["Guard"]:
-            for q2 in A["Guard"][q]:
-                guard = A["Guard"][q].get(q2)
-                jump = A["Jump"].get(q, {}).get(q2, lambda x: x)
-                event = A.get("Event", {}).get(q, {}).get(q2, None)
-
-                # Verification of firing conditions
-                guard_true = guard(x) if callable(guard) else False
-                event_true = A["E"].get(event, False) if event else False
-
-                if guard_true or event_true:
-                    x = jump(x)  # Apply reset (jumps)
-                    q = q2
+    signals = _input_signals(A)
+    for signal in signals or []:
+        reset_input_signal(signal)
+
+    # Firing times of the stochastic transitions leaving q
+    clocks = {}
+    if A.get("Rate"):
+        if not isinstance(rng, RandomStream):
+            rng = RandomStream(rng)
+        clocks = schedule_stochastic(A, q, t, rng)
+
+    detect_cycles = detect_cycles and not (
+        signals or A.get("Rate") or monitors or observer
+    )
+    visits = {}  # q -> (sample index, x) after the last transitions to q
+    fast_forward = fast_forward and not (monitors or observer)
+    compacted = False  # Some idle segments were skipped
+    # Events scheduled after t_max are never applied
+    n_events = sum(1 for e in event_schedule if e[0] < t_max)
+
+    # The samples recorded before an error are handed to the writer too
+    try:
+        while t < t_max:
+            # Apply programmed events
+            while (
+                current_event_index < len(event_schedule)
+                and t >= event_schedule[current_event_index][0]
+            ):
+                _, name, value = event_schedule[current_event_index]
+                A["E"][name] = value
+                current_event_index += 1
+
+            u = [input_value(signal, t) for signal in signals] if signals else None
+            if fast_forward:
+                t_stop = t_max
+                if current_event_index < len(event_schedule):
+                    t_stop = min(t_stop, event_schedule[current_event_index][0])
+                steps, t_next, dx = _idle_steps(A, q, x, t, dt, t_stop, clocks, u)
+                if steps > 1:
+                    t = t_next
+                    x = [x[i] + dx[i] * steps * dt for i in range(len(x))]
+                    record(t, q, x)
+                    compacted = True
+                    continue
+
+            # Flow
+            if signals:
+                dx = A["flow"][q](x, t, u)
+            else:
+                dx = A["flow"][q](x, t)
+            if observer is not None:
+                observer.step(t, q, x, u, dx)
+            x = [x[i] + dx[i] * dt for i in range(len(x))]
+
+            # Try to activate transition
+            transitioned = False
+            if q in A["Guard"]:
+                for q2 in A["Guard"][q]:
+                    guard = A["Guard"][q].get(q2)
+                    jump = A["Jump"].get(q, {}).get(q2, lambda x: x)
+                    event = A.get("Event", {}).get(q, {}).get(q2, None)
+
+                    # Verification of firing conditions
+                    guard_true = guard(x) if callable(guard) else False
+                    event_true = A["E"].get(event, False) if event else False
+                    stochastic_true = bool(clocks) and stochastic_fires(
+                        A, q, q2, clocks, rng, x, t
+                    )
+
+                    if guard_true or event_true or stochastic_true:
+                        x_new = jump(x)  # Apply reset (jumps)
+                        if observer is not None:
+                            observer.jump(t, q, q2, x, x_new, u, guard_true)
+                        x = x_new
+                        q = q2
+                        A["q"] = q
+                        A["x"] = x[:]
+                        if A.get("Rate"):
+                            clocks = schedule_stochastic(A, q, t + dt, rng)
+                        transitioned = True
+                        break
+
+            # Time
+            t += dt
+            record(t, q, x)
+
+            if transitioned and detect_cycles and current_event_index >= n_events:
+                index = len(trace) - 1
+                seen = visits.setdefault(q, deque(maxlen=CYCLE_MEMORY))
+                start = next((i for i, y in seen if _same_state(x, y, cycle_tol)), None)
+                if start is not None:
+                    if compacted:
+                        remaining = _tail_samples(trace, start, t_max)
+                    else:
+                        # Same number of samples as the stepping (rounding of t included)
+                        remaining = _steps_until(t, dt, t_max)[0]
+                    trace.repeat_cycle(start, remaining)
+                    t, q, x = trace[-1]
                     A["q"] = q
                     A["x"] = x[:]
-                    # transitioned = True
                     break
+                seen.append((index, x[:]))
 
-        # Time
-        t += dt
-        trace.append((t, q, x[:]))
+            decided = True
+            for monitor in monitors:
+                decided = monitor.update(t, q, x) is not None and decided
+            if monitors and decided and stop_when_decided:
+                break
 
+        for monitor in monitors:
+            monitor.finish(t)
+    finally:
+        if writer is not None:
+            writer.write(trace, written)
     return trace
 
 
@@ -68,9 +331,11 @@ def plot_trace(trace, A):
     Plots the evolution of continuous and discrete states over time.
 
     Parameters:
-        - trace (list): The trace returned by `simulate`.
+        - trace (Trace): The trace returned by `simulate`.
         - A (dict): The hybrid automaton structure, used to label variables.
     """
+    import matplotlib.pyplot as plt  # Imported on demand: simulate does not need it
+
     times = [t for t, _, _ in trace]
     states = [q for _, q, _ in trace]
     state_set = sorted(set(states))
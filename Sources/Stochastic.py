@@ -0,0 +1,164 @@
+import math
+import random
+
+"""
+Stochastic transitions of hybrid automata.
+A stochastic transition fires after a random delay drawn when its origin state
+is entered (next-event time generation), instead of a Bernoulli draw at each
+step. The delay laws are:
+    - exponential(rate): constant rate (Gillespie race between the edges),
+    - weibull(shape, scale): ageing failures, the age being the time in the state,
+    - intensity(func, bound): time and state dependent rate func(x, t) <= bound,
+      sampled by thinning (candidates at rate bound, accepted with func/bound).
+The random numbers come from a RandomStream which draws them in batches (with
+numpy when it is available). Streams spawned from one seed are independent, so
+the runs of an ensemble are reproducible and can be simulated in parallel.
+"""
+
+# --- Delay laws ---
+
+
+def exponential(rate):
+    """Exponential delay of constant rate (events per time unit)"""
+    if rate <= 0:
+        raise ValueError("The rate must be positive.")
+    return {"law": "exponential", "rate": rate}
+
+
+def weibull(shape, scale):
+    """Weibull delay (shape > 1 for ageing failures, shape = 1 is exponential)"""
+    if shape <= 0 or scale <= 0:
+        raise ValueError("The shape and the scale must be positive.")
+    return {"law": "weibull", "shape": shape, "scale": scale}
+
+
+def intensity(func, bound):
+    """Delay of rate func(x, t), bounded by bound, sampled by thinning"""
+    if bound <= 0:
+        raise ValueError("The bound must be positive.")
+    return {"law": "intensity", "func": func, "bound": bound}
+
+
+# --- Random streams ---
+
+
+class RandomStream:
+    """
+    Source of uniform random numbers drawn in batches of batch_size.
+    Parameters:
+        seed: int, or numpy SeedSequence (see spawn_streams).
+    """
+
+    __slots__ = ("_buffer", "_generator", "_index", "_numpy", "batch_size")
+
+    def __init__(self, seed=None, batch_size=1024):
+        try:
+            import numpy as np
+
+            self._generator = np.random.default_rng(seed)
+            self._numpy = True
+        except ImportError:
+            self._generator = random.Random(seed)
+            self._numpy = False
+        self.batch_size = batch_size
+        self._buffer = []
+        self._index = 0
+
+    def uniforms(self, n):
+        """Returns n uniform numbers in [0, 1[ drawn at once"""
+        if self._numpy:
+            return self._generator.random(n).tolist()
+        return [self._generator.random() for _ in range(n)]
+
+    def uniform(self):
+        """Returns a uniform number in [0, 1["""
+        if self._index >= len(self._buffer):
+            self._buffer = self.uniforms(self.batch_size)
+            self._index = 0
+        u = self._buffer[self._index]
+        self._index += 1
+        return u
+
+    def exponential(self, rate):
+        """Returns an exponential delay of the given rate"""
+        return -math.log1p(-self.uniform()) / rate
+
+
+def spawn_streams(seed, n, batch_size=1024):
+    """Returns n independent random streams derived from one seed"""
+    try:
+        import numpy as np
+
+        seeds = np.random.SeedSequence(seed).spawn(n)
+    except ImportError:
+        seeds = [seed * 2**32 + i for i in range(n)]
+    return [RandomStream(s, batch_size) for s in seeds]
+
+
+# --- Sampling ---
+
+
+def sample_delay(rate, stream):
+    """
+    Samples the delay before a stochastic transition fires. For an intensity law
+    it is the delay before the next candidate, to be accepted with accept_candidate.
+    """
+    law = rate["law"]
+    if law == "exponential":
+        return stream.exponential(rate["rate"])
+    if law == "weibull":
+        return rate["scale"] * (-math.log1p(-stream.uniform())) ** (1.0 / rate["shape"])
+    if law == "intensity":
+        return stream.exponential(rate["bound"])
+    raise ValueError(f"Unknown law '{law}'.")
+
+
+def accept_candidate(rate, stream, x, t):
+    """Thinning: tells if a candidate firing time of an intensity law is accepted"""
+    if rate["law"] != "intensity":
+        return True
+    return stream.uniform() * rate["bound"] < rate["func"](x, t)
+
+
+def sample_delays(rate, n, stream):
+    """
+    Samples n delays at once (e.g. first failure times of an ensemble), as a
+    numpy array when numpy is available. Intensity laws depend on the trajectory
+    and cannot be sampled in advance.
+    """
+    law = rate["law"]
+    if law not in ("exponential", "weibull"):
+        raise ValueError(f"The law '{law}' cannot be sampled in batch.")
+    try:
+        import numpy as np
+
+        e = -np.log1p(-np.asarray(stream.uniforms(n)))
+        if law == "exponential":
+            return e / rate["rate"]
+        return rate["scale"] * e ** (1.0 / rate["shape"])
+    except ImportError:
+        return [sample_delay(rate, stream) for _ in range(n)]
+
+
+def schedule_stochastic(A, q, t, stream):
+    """
+    Draws the firing times of the stochastic transitions leaving q when q is
+    entered at time t. Returns a dict q_to -> firing time.
+    """
+    rates = A.get("Rate", {}).get(q, {})
+    return {q2: t + sample_delay(rate, stream) for q2, rate in rates.items()}
+
+
+def stochastic_fires(A, q, q2, clocks, stream, x, t):
+    """
+    Tells if the stochastic transition from q to q2 fires at time t. A rejected
+    candidate of an intensity law is replaced by the next one.
+    """
+    fire_time = clocks.get(q2)
+    if fire_time is None or t < fire_time:
+        return False
+    rate = A["Rate"][q][q2]
+    if accept_candidate(rate, stream, x, t):
+        return True
+    clocks[q2] = fire_time + sample_delay(rate, stream)
+    return False
@@ -0,0 +1,355 @@
+from array import array
+
+"""
+Columnar storage of simulation traces.
+A Trace keeps the time, the discrete state and every continuous variable in
+contiguous numeric buffers (array.array). It still behaves like the former
+list of (time, discrete_state, continuous_state) tuples, and its buffers can
+be shared with pandas or Arrow without copy.
+"""
+
+
+class Trace:
+    """
+    Trace of a hybrid automaton simulation.
+    Attributes:
+        names (list): Names of the continuous variables.
+        t (array): Times of the samples.
+        codes (array): Discrete state of each sample, as an index in modes.
+        modes (list): Discrete states in order of first appearance.
+        x (list of array): One buffer per continuous variable.
+        cycle (dict): Limit cycle repeated at the end of the trace (see
+            repeat_cycle), or None.
+    """
+
+    __slots__ = (
+        "_codes",
+        "_mode_index",
+        "_t",
+        "_tail",
+        "_x",
+        "cycle",
+        "modes",
+        "names",
+    )
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._t = array("d")
+        self._codes = array("i")
+        self.modes = []
+        self._x = [array("d") for _ in self.names]
+        self._mode_index = {}
+        self._tail = None  # (start, samples, period) of a repeated cycle
+        self.cycle = None
+
+    # The buffers hold every sample: a repeated cycle is expanded when they are accessed
+
+    @property
+    def t(self):
+        self._materialize()
+        return self._t
+
+    @property
+    def codes(self):
+        self._materialize()
+        return self._codes
+
+    @property
+    def x(self):
+        self._materialize()
+        return self._x
+
+    def mode_code(self, q):
+        """Returns the code of the discrete state q, registering it if needed"""
+        code = self._mode_index.get(q)
+        if code is None:
+            code = len(self.modes)
+            self._mode_index[q] = code
+            self.modes.append(q)
+        return code
+
+    def append(self, t, q, x):
+        """Appends the sample (t, q, x) to the trace"""
+        self._materialize()
+        self._t.append(t)
+        self._codes.append(self.mode_code(q))
+        for column, value in zip(self._x, x):
+            column.append(value)
+
+    def extend(self, t, codes, x):
+        """
+        Appends samples given as buffers: times, discrete state codes (see
+        mode_code) and one buffer per continuous variable.
+        """
+        self._materialize()
+        self._t.extend(t)
+        self._codes.extend(codes)
+        for column, values in zip(self._x, x):
+            column.extend(values)
+
+    def repeat_cycle(self, start, samples):
+        """
+        Extends the trace with samples more samples by repeating its last cycle:
+        the last sample is the sample start one period later. The samples are
+        computed on access, and only stored when the buffers are accessed.
+        """
+        end = len(self._t) - 1
+        if self._tail is not None or not 0 <= start < end:
+            raise ValueError("The cycle must end at the last sample of the trace.")
+        period = self._t[end] - self._t[start]
+        self._tail = (start, samples, period)
+        self.cycle = {
+            "start": self._t[start],
+            "period": period,
+            "samples": end - start,
+            "extrapolated": samples,
+        }
+
+    def _source(self, i):
+        """Returns (stored sample, number of periods) of the sample i of the tail"""
+        start, _, _ = self._tail
+        j = i - (len(self._t) - 1)
+        length = len(self._t) - 1 - start
+        return start + j % length, j // length + 1
+
+    def _materialize(self):
+        if self._tail is None:
+            return
+        start, samples, period = self._tail
+        self._tail = None
+        end = len(self._t) - 1
+        blocks = -(-(samples + 1) // (end - start))
+        times = array("d")
+        t_cycle = self._t[start:end]
+        for k in range(1, blocks + 1):
+            times.extend([v + k * period for v in t_cycle])
+        self._t.extend(times[1 : samples + 1])
+        self._codes.extend((self._codes[start:end] * blocks)[1 : samples + 1])
+        for column in self._x:
+            column.extend((column[start:end] * blocks)[1 : samples + 1])
+
+    def column(self, name):
+        """Returns the buffer of the continuous variable name"""
+        return self.x[self.names.index(name)]
+
+    def _row(self, i):
+        shift = 0.0
+        if i >= len(self._t):
+            i, periods = self._source(i)
+            shift = periods * self._tail[2]
+        return (
+            self._t[i] + shift,
+            self.modes[self._codes[i]],
+            [column[i] for column in self._x],
+        )
+
+    def __len__(self):
+        return len(self._t) + (self._tail[1] if self._tail else 0)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trace index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        modes = self.modes
+        columns = self._x
+        for i, (t, code) in enumerate(zip(self._t, self._codes)):
+            yield (t, modes[code], [column[i] for column in columns])
+        for i in range(len(self._t), len(self)):
+            yield self._row(i)
+
+    def __repr__(self):
+        return f"Trace({len(self)} samples, X={self.names}, Q={self.modes})"
+
+    # --- Export ---
+
+    def to_pandas(self):
+        """
+        Returns a pandas DataFrame with the columns t, q and one column per
+        continuous variable. The numeric columns are views on the buffers of the
+        trace (no copy) and q is categorical. While the DataFrame is alive the
+        trace can no longer be extended.
+        """
+        import numpy as np
+        import pandas as pd
+
+        data = {"t": np.frombuffer(self.t, dtype=np.float64)}
+        data["q"] = pd.Categorical.from_codes(
+            np.frombuffer(self.codes, dtype=np.intc), categories=self.modes
+        )
+        for name, column in zip(self.names, self.x):
+            data[name] = np.frombuffer(column, dtype=np.float64)
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        """
+        Returns a pyarrow Table with the same columns as to_pandas. The numeric
+        buffers are wrapped without copy and q is dictionary-encoded.
+        """
+        import pyarrow as pa
+
+        n = len(self)
+
+        def wrap(buffer, arrow_type):
+            return pa.Array.from_buffers(arrow_type, n, [None, pa.py_buffer(buffer)])
+
+        codes_type = pa.int32() if self.codes.itemsize == 4 else pa.int64()
+        columns = {
+            "t": wrap(self.t, pa.float64()),
+            "q": pa.DictionaryArray.from_arrays(
+                wrap(self.codes, codes_type), pa.array(self.modes)
+            ),
+        }
+        for name, column in zip(self.names, self.x):
+            columns[name] = wrap(column, pa.float64())
+        return pa.table(columns)
+
+
+# --- Bulk analytics ---
+
+
+def _as_traces(traces):
+    return [traces] if isinstance(traces, Trace) else list(traces)
+
+
+def _segments(trace):
+    """
+    Returns the runs of consecutive samples in the same discrete state as three
+    numpy arrays (code, start, end). The state of a sample holds until the next
+    sample.
+    """
+    import numpy as np
+
+    codes = np.frombuffer(trace.codes, dtype=np.intc)
+    if not len(codes):
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    ends = np.append(starts[1:], len(codes) - 1)
+    return codes[starts], starts, ends
+
+
+def dwell_times(traces):
+    """
+    Computes the duration of every visit of each discrete state.
+    Parameters:
+        traces (Trace or list of Trace): The traces to analyse.
+    Returns:
+        dict: Discrete state -> list of visit durations. The last visit of each
+        trace is truncated at the end of the trace.
+    """
+    import numpy as np
+
+    result = {}
+    for trace in _as_traces(traces):
+        codes, starts, ends = _segments(trace)
+        t = np.frombuffer(trace.t, dtype=np.float64)
+        durations = t[ends] - t[starts]
+        for code in np.unique(codes).tolist():
+            visits = durations[codes == code].tolist()
+            result.setdefault(trace.modes[code], []).extend(visits)
+    return result
+
+
+def transition_counts(traces):
+    """
+    Counts the discrete transitions.
+    Returns:
+        dict: (q_from, q_to) -> number of transitions over all the traces.
+    """
+    import numpy as np
+
+    result = {}
+    for trace in _as_traces(traces):
+        codes = _segments(trace)[0].astype(np.int64)
+        n_modes = len(trace.modes)
+        edges, counts = np.unique(codes[:-1] * n_modes + codes[1:], return_counts=True)
+        for edge, count in zip(edges.tolist(), counts.tolist()):
+            key = (trace.modes[edge // n_modes], trace.modes[edge % n_modes])
+            result[key] = result.get(key, 0) + count
+    return result
+
+
+def transition_log(trace):
+    """
+    Yields the transitions (t, q_from, q_to) of a trace in time order. The time
+    of a transition is the time of the first sample in q_to. A repeated cycle
+    (see Trace.repeat_cycle) is not expanded.
+    """
+    codes, times, modes = trace._codes, trace._t, trace.modes
+    for i in range(1, len(codes)):
+        if codes[i] != codes[i - 1]:
+            yield times[i], modes[codes[i - 1]], modes[codes[i]]
+    if trace._tail is None:
+        return
+    start, samples, period = trace._tail
+    length = len(codes) - 1 - start
+    offsets = [
+        o for o in range(1, length + 1) if codes[start + o] != codes[start + o - 1]
+    ]
+    for m in range(samples // length + 1):
+        for o in offsets:
+            if o + m * length > samples:
+                return
+            yield (
+                times[start + o] + (m + 1) * period,
+                modes[codes[start + o - 1]],
+                modes[codes[start + o]],
+            )
+
+
+def uniform_grid(t_start, t_end, dt):
+    """Returns the times t_start + k * dt lying in [t_start, t_end]"""
+    n = int((t_end - t_start) / dt + 1e-9) + 1
+    return [t_start + k * dt for k in range(n)]
+
+
+def _to_array(typecode, values):
+    buffer = array(typecode)
+    buffer.frombytes(values.tobytes())
+    return buffer
+
+
+def resample(traces, grid):
+    """
+    Resamples traces onto a common time grid. The continuous variables are
+    linearly interpolated and the discrete state is held (zero-order-hold).
+    Parameters:
+        traces (Trace or list of Trace): The traces to resample.
+        grid (list): Sorted sample times (see uniform_grid).
+    Returns:
+        Trace or list of Trace: The resampled traces.
+    """
+    import numpy as np
+
+    grid = np.asarray(grid, dtype=np.float64)
+    resampled = []
+    for trace in _as_traces(traces):
+        out = Trace(trace.names)
+        times = np.frombuffer(trace.t, dtype=np.float64)
+        if len(times) and len(grid):
+            held = np.searchsorted(times, grid, side="right") - 1
+            held = np.clip(held, 0, len(times) - 1)
+            codes = np.frombuffer(trace.codes, dtype=np.intc)[held]
+            # Modes of the resampled trace in order of first appearance
+            _, first = np.unique(codes, return_index=True)
+            mapping = np.zeros(len(trace.modes), dtype=np.intc)
+            for code in codes[np.sort(first)].tolist():
+                mapping[code] = out.mode_code(trace.modes[code])
+            columns = [
+                np.interp(grid, times, np.frombuffer(column, dtype=np.float64))
+                for column in trace.x
+            ]
+            out.extend(
+                _to_array("d", grid),
+                _to_array("i", mapping[codes]),
+                [_to_array("d", column) for column in columns],
+            )
+        resampled.append(out)
+    return resampled[0] if isinstance(traces, Trace) else resampled
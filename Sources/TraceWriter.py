@@ -0,0 +1,240 @@
+import json
+import lzma
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+from Trace import Trace
+
+"""
+Background writing of simulation traces.
+A TraceWriter receives the samples of a trace by chunks (see simulate(...,
+writer=...)) and hands them to a writer thread which compresses and writes them,
+so the simulation goes on during the compression and the disk I/O (zlib and
+lzma release the GIL). The queue of chunks is bounded: when the writer falls
+behind, the simulation waits (backpressure) instead of filling the memory.
+
+File format (little-endian):
+    b"HATRACE1", header length (uint32), JSON header {"names", "compression"},
+    then for each chunk: payload length (uint32), compressed payload made of
+    n (uint32), length of the new modes (uint32), JSON list of the discrete
+    states seen for the first time, n times (float64), n mode codes (int32)
+    and n values (float64) per continuous variable.
+"""
+
+MAGIC = b"HATRACE1"
+
+COMPRESSIONS = {
+    None: (lambda data, level: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+
+def _little_endian(buffer):
+    if sys.byteorder == "big":
+        buffer = array(buffer.typecode, buffer)
+        buffer.byteswap()
+    return buffer.tobytes()
+
+
+class TraceWriter:
+    """
+    Writes the samples of one trace to a file from a background thread.
+    Parameters:
+        path: Output file.
+        names (list): Names of the continuous variables.
+        chunk_size: Number of samples compressed together.
+        max_pending: Number of chunks waiting for the writer before the
+            producer is blocked.
+        compression: "zlib", "lzma" or None.
+        level: Compression level.
+    Use it as a context manager: the pending chunks are written and the file is
+    closed when the block ends, also when an error is raised.
+    """
+
+    def __init__(
+        self, path, names, chunk_size=8192, max_pending=4, compression="zlib", level=6
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'.")
+        if chunk_size <= 0 or max_pending <= 0:
+            raise ValueError("chunk_size and max_pending must be positive.")
+        self.names = list(names)
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.level = level
+        self._compress = COMPRESSIONS[compression][0]
+        self._modes_sent = 0
+        self._error = None
+        self._closed = False
+        # Counters (see stats)
+        self.samples = 0
+        self.chunks = 0
+        self.raw_bytes = 0
+        self.written_bytes = 0
+        self.write_seconds = 0.0
+        self.wait_seconds = 0.0
+
+        self._file = open(path, "wb")
+        header = json.dumps({"names": self.names, "compression": compression}).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(
+            target=self._run, name="TraceWriter", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        try:
+            self.close()  # Keeps the samples produced before the error
+        except Exception:
+            pass  # The original error is more relevant
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("The trace writer is closed.")
+
+    def write(self, trace, start=0, end=None):
+        """
+        Hands the samples start:end of the trace to the writer thread, by chunks
+        of chunk_size samples. Blocks while max_pending chunks are waiting.
+        """
+        self._check()
+        end = len(trace) if end is None else end
+        t, codes, x = trace.t, trace.codes, trace.x
+        for a in range(start, end, self.chunk_size):
+            b = min(a + self.chunk_size, end)
+            new_modes = trace.modes[self._modes_sent :]
+            self._modes_sent = len(trace.modes)
+            chunk = (t[a:b], codes[a:b], [column[a:b] for column in x], new_modes)
+            started = time.perf_counter()
+            self._queue.put(chunk)
+            self.wait_seconds += time.perf_counter() - started
+
+    def flush(self):
+        """Waits until every chunk handed to the writer is written"""
+        self._check()
+        self._queue.join()
+        self._file.flush()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Writes the pending chunks, stops the writer thread and closes the file"""
+        if self._closed:
+            return
+        try:
+            self._queue.join()
+        finally:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self._error is None:  # After an error the chunks are dropped
+                    self._write_chunk(*chunk)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_chunk(self, t, codes, x, new_modes):
+        started = time.perf_counter()
+        modes = json.dumps(new_modes).encode()
+        payload = b"".join(
+            [
+                struct.pack("<II", len(t), len(modes)),
+                modes,
+                _little_endian(t),
+                _little_endian(codes),
+                *(_little_endian(column) for column in x),
+            ]
+        )
+        data = self._compress(payload, self.level)
+        self._file.write(struct.pack("<I", len(data)) + data)
+        self.samples += len(t)
+        self.chunks += 1
+        self.raw_bytes += len(payload)
+        self.written_bytes += len(data) + 4
+        self.write_seconds += time.perf_counter() - started
+
+    def stats(self):
+        """
+        Returns the throughput counters: samples, chunks and bytes written, the
+        compression ratio, the time spent by the writer thread, the time the
+        producer waited for it, and the writer throughput in samples per second.
+        """
+        return {
+            "samples": self.samples,
+            "chunks": self.chunks,
+            "pending": self._queue.qsize(),
+            "raw_bytes": self.raw_bytes,
+            "written_bytes": self.written_bytes,
+            "compression_ratio": self.raw_bytes / self.written_bytes
+            if self.written_bytes
+            else None,
+            "write_seconds": self.write_seconds,
+            "wait_seconds": self.wait_seconds,
+            "samples_per_second": self.samples / self.write_seconds
+            if self.write_seconds
+            else None,
+        }
+
+
+def _from_little_endian(typecode, data):
+    buffer = array(typecode)
+    buffer.frombytes(data)
+    if sys.byteorder == "big":
+        buffer.byteswap()
+    return buffer
+
+
+def read_trace(path):
+    """Reads a trace written by a TraceWriter"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{path}' is not a trace file.")
+        (size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size))
+        decompress = COMPRESSIONS[header["compression"]][1]
+        trace = Trace(header["names"])
+        while True:
+            prefix = f.read(4)
+            if not prefix:
+                break
+            (size,) = struct.unpack("<I", prefix)
+            payload = decompress(f.read(size))
+            n, modes_size = struct.unpack_from("<II", payload)
+            offset = 8 + modes_size
+            for q in json.loads(payload[8:offset]):
+                trace.mode_code(q)
+            columns = []
+            for typecode in ["d", "i"] + ["d"] * len(trace.names):
+                width = array(typecode).itemsize * n
+                columns.append(
+                    _from_little_endian(typecode, payload[offset : offset + width])
+                )
+                offset += width
+            trace.extend(columns[0], columns[1], columns[2:])
+    return trace
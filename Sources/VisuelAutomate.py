@@ -1,13 +1,18 @@
-from graphviz import Digraph
+import os
 import re
 
 
-def visualiser_automate(A, filename="Hybrid_Automato", functions=None):
+def visualiser_automate(
+    A, filename="Hybrid_Automato", functions=None, directory="Thermostat_Results"
+):
     """
     Visualise a hybrid automaton using Graphviz, including:
         - discrete states (nodes) with continuous dynamics,
         - transitions with guards, events, and resets.
+    The diagram is rendered as directory/filename.png (filename alone if directory is None).
     """
+    from graphviz import Digraph  # Imported on demand: it is slow to import
+
     # Graph creation
     dot = Digraph(comment="Hybrid Automaton")
 
@@ -139,5 +144,6 @@ def visualiser_automate(A, filename="Hybrid_Automato", functions=None):
         dot.edge(src, dst, label=label)
 
     # Graph generation
-    dot.render("Thermostat_Results/" + filename, format="png", cleanup=True)
+    path = os.path.join(directory, filename) if directory else filename
+    dot.render(path, format="png", cleanup=True)
     print(f"Automaton Generated : {filename}.png")
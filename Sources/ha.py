@@ -0,0 +1,195 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+"""
+Headless command-line runner of exported hybrid automata.
+    python Sources/ha.py MODEL.txt [--dt DT] [--t-max T] [--event TIME:NAME:VALUE ...]
+                                   [--schedule FILE] [--seed N] [--trace FILE]
+                                   [--summary FILE] [--record FILE] [--cache DIR]
+                                   [--plot] [--graph NAME] [--timings]
+Only the simulation engine is imported by default: matplotlib (--plot) and
+graphviz (--graph) are imported when they are requested.
+"""
+
+_TRUE = ("1", "true", "on", "yes")
+_FALSE = ("0", "false", "off", "no")
+
+
+def parse_event(text):
+    """Parses an event TIME:NAME:VALUE, e.g. 1.0:alpha:true"""
+    try:
+        time_text, name, value = text.rsplit(":", 2)
+        if value.lower() not in _TRUE + _FALSE:
+            raise ValueError
+        return (float(time_text), name, value.lower() in _TRUE)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid event '{text}' (expected TIME:NAME:true|false)"
+        ) from None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="ha", description="Simulates an exported hybrid automaton."
+    )
+    parser.add_argument("model", help="automaton exported as JSON")
+    parser.add_argument("--dt", type=float, default=0.01, help="time step")
+    parser.add_argument("--t-max", type=float, default=10.0, help="simulation horizon")
+    parser.add_argument(
+        "--event",
+        type=parse_event,
+        action="append",
+        default=[],
+        metavar="TIME:NAME:VALUE",
+        help="scheduled event (repeatable)",
+    )
+    parser.add_argument(
+        "--schedule", help="JSON file with a list of [time, event, value] entries"
+    )
+    parser.add_argument("--seed", type=int, help="seed of the stochastic transitions")
+    parser.add_argument("--trace", help="writes the trace as CSV ('-' for stdout)")
+    parser.add_argument(
+        "--summary", help="writes a JSON summary ('-' for stdout, the default)"
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="writes the compressed trace from a background thread (see TraceWriter.py)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="reuses the results of identical runs stored in DIR (see ResultCache.py)",
+    )
+    parser.add_argument("--plot", action="store_true", help="plots the trace")
+    parser.add_argument(
+        "--graph", metavar="NAME", help="renders the automaton as NAME.png"
+    )
+    parser.add_argument(
+        "--timings", action="store_true", help="prints the time of each stage on stderr"
+    )
+    return parser
+
+
+def summarize(trace):
+    """Returns a JSON-compatible summary of a trace"""
+    from Trace import dwell_times, transition_counts
+
+    t_end, q_end, x_end = trace[-1]
+    return {
+        "samples": len(trace),
+        "t_end": t_end,
+        "final_state": {"q": q_end, "x": x_end},
+        "dwell_times": {q: sum(d) for q, d in dwell_times(trace).items()},
+        "transitions": {
+            f"{q1}->{q2}": n for (q1, q2), n in transition_counts(trace).items()
+        },
+    }
+
+
+def _open_output(path):
+    return sys.stdout if path == "-" else open(path, "w", newline="")
+
+
+def write_trace(trace, path):
+    """Writes the trace as CSV: t, q and one column per continuous variable"""
+    f = _open_output(path)
+    try:
+        writer = csv.writer(f)
+        writer.writerow(["t", "q", *trace.names])
+        for t, q, x in trace:
+            writer.writerow([repr(t), q, *map(repr, x)])
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def write_summary(trace, path):
+    f = _open_output(path)
+    try:
+        json.dump(summarize(trace), f, indent=4)
+        f.write("\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        start = now
+
+    from HybridAutomaton import load_automate_from_txt
+    from Simulation import simulate
+
+    lap("import")
+    A = load_automate_from_txt(args.model)
+    schedule = list(args.event)
+    if args.schedule:
+        with open(args.schedule, "r") as f:
+            schedule += [tuple(e) for e in json.load(f)]
+    lap("load")
+
+    writer = None
+    if args.record:
+        from TraceWriter import TraceWriter
+
+        writer = TraceWriter(args.record, A["X"])
+    try:
+        if args.cache:
+            from ResultCache import ResultCache
+
+            cache = ResultCache(args.cache)
+            trace = cache.simulate(A, args.dt, args.t_max, schedule, rng=args.seed)
+            if writer is not None:
+                writer.write(trace)
+        else:
+            trace = simulate(
+                A,
+                dt=args.dt,
+                t_max=args.t_max,
+                event_schedule=schedule,
+                rng=args.seed,
+                writer=writer,
+            )
+    finally:
+        if writer is not None:
+            writer.close()
+    lap("simulate")
+
+    if args.trace:
+        write_trace(trace, args.trace)
+    if args.summary or not args.trace:
+        write_summary(trace, args.summary or "-")
+    lap("output")
+
+    if args.graph:
+        from HybridAutomaton import automate_functions, collect_functions
+        from VisuelAutomate import visualiser_automate
+
+        functions = collect_functions(*automate_functions(A))
+        visualiser_automate(A, filename=args.graph, functions=functions, directory=None)
+        lap("graph")
+    if args.plot:
+        from Simulation import plot_trace
+
+        plot_trace(trace, A)
+        lap("plot")
+
+    if args.timings:
+        for stage, seconds in timings.items():
+            print(f"{stage:>9}: {1000 * seconds:9.2f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
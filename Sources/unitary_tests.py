@@ -9,11 +9,80 @@ from HybridAutomaton import (
     set_flow,
     set_invariant,
     set_jump,
+    set_guard,
+    set_rate,
+    define_event_set,
+    define_input_space,
+    set_input,
     export_automate_to_txt_with_functions,
+    stream_automate_to_json,
+    collect_functions,
+    load_automate_from_txt,
 )
+from AutomatonBuilder import AutomatonBuilder
+from Calibration import Calibration, LossMonitor, trace_loss
+from Fleet import Fleet
+from HtPNConverter import convert_automate_to_htpn, convert_directory
+from ha import main as ha_main
+from InputSignal import (
+    create_input_signal,
+    input_value,
+    input_values,
+    load_input_signal,
+)
+from ResultCache import ResultCache, run_key
+from Sensitivity import simulate_sensitivity
+from Simulation import is_constant_flow, simulate
+from ModelChecking import (
+    randomized_run,
+    enters_within,
+    estimate_probability,
+    sprt,
+    clopper_pearson,
+)
+from STLMonitor import (
+    STLMonitor,
+    Always,
+    And,
+    Eventually,
+    Implies,
+    greater,
+    in_mode,
+    less,
+)
+from Stochastic import (
+    RandomStream,
+    exponential,
+    intensity,
+    sample_delays,
+    spawn_streams,
+    weibull,
+)
+from TraceWriter import TraceWriter, read_trace
+from Trace import (
+    Trace,
+    dwell_times,
+    transition_counts,
+    transition_log,
+    resample,
+    uniform_grid,
+)
+from functools import partial
+import importlib.util
+import io
 import json
+import math
+import subprocess
+import sys
 import tempfile
+import time
 import os
+import numpy as np
+
+SOURCES = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SOURCES)
+MACHINE_MODEL = os.path.join(ROOT, "MachineRep_Results", "automate_machine.txt")
+THERMOSTAT_MODEL = os.path.join(ROOT, "Thermostat_Results", "automate_thermostat.txt")
 
 
 class TestHybridAutomaton(unittest.TestCase):
@@ -224,3 +293,1018 @@ class TestExport(unittest.TestCase):
 
         # Removing file
         os.remove(tmpfile.name)
+
+    def build_automaton(self, n=3):
+        automaton = create_automate()
+        names = [f"Q{i}" for i in range(n)]
+        for q in names:
+            add_discrete_state(automaton, q)
+        define_continuous_space(automaton, ["x"])
+        set_initial_state(automaton, "Q0", [1.5])
+        for q1, q2 in zip(names, names[1:] + names[:1]):
+            set_flow(automaton, q1, ramp_flow)
+            set_guard(automaton, q1, q2, ramp_guard)
+            add_transition(automaton, q1, q2, guard="ramp_guard")
+        return automaton
+
+    def test_collect_functions(self):
+        def local_flow(x, t):
+            return [2.0]
+
+        functions = collect_functions(ramp_flow, local_flow, None, ramp_flow)
+        self.assertEqual(list(functions), ["ramp_flow", "local_flow"])
+        self.assertIn("return [2.0]", functions["local_flow"])
+        print("Test collect functions OK")
+
+    def test_stream_export_matches_json(self):
+        automaton = self.build_automaton()
+        functions = collect_functions(ramp_flow, ramp_guard)
+        for indent in (None, 4):
+            stream = io.StringIO()
+            stream_automate_to_json(automaton, stream, functions, indent=indent)
+            data = json.loads(stream.getvalue())
+            self.assertEqual(stream.getvalue(), json.dumps(data, indent=indent))
+        self.assertEqual(data["Guard"]["Q2"], {"Q0": "ramp_guard"})
+        self.assertEqual(data["functions"], functions)
+        print("Test streaming export OK")
+
+    def test_export_without_cache(self):
+        # Same bytes as the incremental export and as json.dumps, at the same cost
+        automaton = self.build_automaton(3000)
+        with tempfile.TemporaryDirectory() as tmp:
+            plain, cached = (os.path.join(tmp, name) for name in ("plain", "cached"))
+            start = time.perf_counter()
+            stats = stream_automate_to_json(automaton, plain, indent=4)
+            elapsed = time.perf_counter() - start
+            self.assertEqual(
+                stream_automate_to_json(automaton, cached, indent=4, cache={}), stats
+            )
+            with open(plain, "r") as f:
+                text = f.read()
+            with open(cached, "r") as f:
+                self.assertEqual(f.read(), text)
+        data = json.loads(text)
+        start = time.perf_counter()
+        self.assertEqual(json.dumps(data, indent=4), text)
+        self.assertLess(elapsed, 5 * (time.perf_counter() - start) + 0.1)
+        print("Test export without cache OK")
+
+    def test_incremental_export(self):
+        automaton = self.build_automaton(1000)
+        cache = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "automaton.json")
+            first = stream_automate_to_json(automaton, path, cache=cache)
+            self.assertEqual(first["rewritten"], first["fragments"])
+            mtime = os.stat(path).st_mtime_ns
+            self.assertEqual(
+                stream_automate_to_json(automaton, path, cache=cache)["rewritten"], 0
+            )
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)  # Not written again
+
+            set_flow(automaton, "Q5", ramp_guard)
+            stats = stream_automate_to_json(automaton, path, cache=cache)
+            self.assertEqual(stats["rewritten"], 1)  # Only the flow of Q5
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.assertEqual(data["flow"]["Q5"], "ramp_guard")
+            self.assertEqual(sorted(data["functions"]), ["ramp_flow", "ramp_guard"])
+        print("Test incremental export OK")
+
+
+class TestInputSignal(unittest.TestCase):
+    def test_zero_order_hold(self):
+        signal = create_input_signal([0.0, 1.0, 2.0], [10.0, 20.0, 30.0])
+        self.assertEqual(input_value(signal, -1.0), 10.0)  # Before the first sample
+        self.assertEqual(input_value(signal, 0.5), 10.0)
+        self.assertEqual(input_value(signal, 1.0), 20.0)
+        self.assertEqual(input_value(signal, 5.0), 30.0)  # After the last sample
+        self.assertEqual(input_value(signal, 0.2), 10.0)  # Going back in time
+        print("Test zero-order-hold input OK")
+
+    def test_linear(self):
+        signal = create_input_signal([0.0, 1.0, 2.0], [0.0, 10.0, 0.0], "linear")
+        self.assertAlmostEqual(input_value(signal, 0.25), 2.5)
+        self.assertAlmostEqual(input_value(signal, 1.5), 5.0)
+        times = [0.001 * k for k in range(2001)]
+        values = input_values(signal, times)
+        for t, v in zip(times, values):
+            self.assertAlmostEqual(v, input_value(signal, t))
+        print("Test linear input OK")
+
+    def test_invalid_signal(self):
+        with self.assertRaises(ValueError):
+            create_input_signal([0.0, 1.0], [1.0])
+        with self.assertRaises(ValueError):
+            create_input_signal([0.0], [1.0], "cubic")
+        print("Test invalid input signal OK")
+
+    def test_simulate_with_input(self):
+        automaton = create_automate()
+        add_discrete_state(automaton, "Q1")
+        define_continuous_space(automaton, ["x"])
+        define_input_space(automaton, ["u", "v"])
+        set_initial_state(automaton, "Q1", [0.0])
+
+        def flow(x, t, u):
+            return [u[0]]
+
+        set_flow(automaton, "Q1", flow)
+        set_input(automaton, "u", create_input_signal([0.0, 0.5], [1.0, 0.0]))
+        with self.assertRaises(ValueError):
+            simulate(automaton, dt=0.1, t_max=1.0)  # No signal set for v
+        set_input(automaton, "v", create_input_signal([0.0], [0.0]))
+        trace = simulate(automaton, dt=0.1, t_max=1.0)
+        self.assertAlmostEqual(trace[-1][2][0], 0.5)
+        with self.assertRaises(ValueError):
+            set_input(automaton, "w", create_input_signal([0.0], [0.0]))
+        print("Test simulation with input signal OK")
+
+
+class TestTrace(unittest.TestCase):
+    def build_trace(self):
+        trace = Trace(["x"])
+        for t, q, x in [
+            (0.0, "Q1", 0.0),
+            (1.0, "Q1", 1.0),
+            (2.0, "Q2", 2.0),
+            (3.0, "Q2", 1.0),
+            (4.0, "Q1", 0.0),
+        ]:
+            trace.append(t, q, [x])
+        return trace
+
+    def test_sequence_behaviour(self):
+        trace = self.build_trace()
+        self.assertEqual(len(trace), 5)
+        self.assertEqual(trace[0], (0.0, "Q1", [0.0]))
+        self.assertEqual(trace[-1], (4.0, "Q1", [0.0]))
+        self.assertEqual([q for _, q, _ in trace], ["Q1", "Q1", "Q2", "Q2", "Q1"])
+        self.assertEqual(trace.modes, ["Q1", "Q2"])
+        self.assertEqual(list(trace.column("x")), [0.0, 1.0, 2.0, 1.0, 0.0])
+        print("Test trace sequence OK")
+
+    def test_bulk_helpers(self):
+        traces = [self.build_trace(), self.build_trace()]
+        self.assertEqual(dwell_times(traces), {"Q1": [2.0, 0.0] * 2, "Q2": [2.0] * 2})
+        self.assertEqual(transition_counts(traces), {("Q1", "Q2"): 2, ("Q2", "Q1"): 2})
+        grid = uniform_grid(0.0, 4.0, 0.5)
+        self.assertEqual(len(grid), 9)
+        resampled = resample(traces[0], grid)
+        self.assertEqual(resampled[1], (0.5, "Q1", [0.5]))
+        self.assertEqual(resampled[5], (2.5, "Q2", [1.5]))
+        self.assertEqual(resampled[-1], (4.0, "Q1", [0.0]))
+        print("Test trace analytics OK")
+
+    def test_to_pandas(self):
+        trace = self.build_trace()
+        df = trace.to_pandas()
+        self.assertEqual(list(df.columns), ["t", "q", "x"])
+        self.assertEqual(list(df["q"].cat.categories), ["Q1", "Q2"])
+        trace.x[0][2] = 5.0  # The DataFrame is a view on the trace buffers
+        self.assertEqual(df["x"][2], 5.0)
+        print("Test trace to pandas OK")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+    def test_to_arrow(self):
+        table = self.build_trace().to_arrow()
+        self.assertEqual(table.column_names, ["t", "q", "x"])
+        self.assertEqual(table.column("q").to_pylist(), ["Q1", "Q1", "Q2", "Q2", "Q1"])
+        print("Test trace to arrow OK")
+
+    def test_simulate_returns_trace(self):
+        automaton = create_automate()
+        add_discrete_state(automaton, "Q1")
+        define_continuous_space(automaton, ["x"])
+        set_initial_state(automaton, "Q1", [0.0])
+        set_flow(automaton, "Q1", lambda x, t: [1.0])
+        trace = simulate(automaton, dt=0.5, t_max=2.0)
+        self.assertIsInstance(trace, Trace)
+        self.assertEqual(list(trace.t), [0.0, 0.5, 1.0, 1.5, 2.0])
+        self.assertEqual(trace[-1][2], [2.0])
+        print("Test simulation trace OK")
+
+    def test_repeat_cycle(self):
+        # The last sample is the first one 4 time units later
+        trace = self.build_trace()
+        trace.repeat_cycle(0, 6)
+        self.assertEqual(len(trace), 11)
+        self.assertEqual(trace[5], (5.0, "Q1", [1.0]))
+        self.assertEqual(trace[-1], (10.0, "Q2", [2.0]))
+        self.assertEqual(
+            [(t, q1, q2) for t, q1, q2 in transition_log(trace)],
+            [
+                (2.0, "Q1", "Q2"),
+                (4.0, "Q2", "Q1"),
+                (6.0, "Q1", "Q2"),
+                (8.0, "Q2", "Q1"),
+                (10.0, "Q1", "Q2"),
+            ],
+        )
+        self.assertEqual(trace.cycle["period"], 4.0)
+        self.assertEqual(list(trace.t), [float(t) for t in range(11)])  # Expanded
+        self.assertEqual(
+            list(trace.column("x")), [0.0, 1.0, 2.0, 1.0] * 2 + [0.0, 1.0, 2.0]
+        )
+        print("Test trace cycle repetition OK")
+
+    def test_limit_cycle(self):
+        def thermostat():
+            automaton = create_automate()
+            define_continuous_space(automaton, ["x"])
+            for q in ["Q1", "Q2"]:
+                add_discrete_state(automaton, q)
+            set_initial_state(automaton, "Q1", [72.0])
+            set_flow(automaton, "Q1", lambda x, t: [-x[0] + 50])
+            set_flow(automaton, "Q2", lambda x, t: [-x[0] + 80])
+            set_guard(automaton, "Q1", "Q2", lambda x: x[0] <= 70)
+            set_guard(automaton, "Q2", "Q1", lambda x: x[0] >= 75)
+            return automaton
+
+        stepped = simulate(thermostat(), 0.01, 200.0)
+        extrapolated = simulate(
+            thermostat(), 0.01, 200.0, detect_cycles=True, cycle_tol=0.0
+        )
+        self.assertIsNotNone(extrapolated.cycle)
+        self.assertLess(extrapolated.cycle["start"], 50.0)
+        self.assertEqual(len(extrapolated), len(stepped))
+        self.assertEqual(extrapolated[-1][1:], stepped[-1][1:])
+        self.assertEqual(transition_counts(extrapolated), transition_counts(stepped))
+        # Monitors need every sample: no extrapolation
+        monitor = STLMonitor(Always(0.0, 1.0, greater(0, 0.0)))
+        monitored = simulate(
+            thermostat(), 0.01, 200.0, monitors=[monitor], detect_cycles=True
+        )
+        self.assertIsNone(monitored.cycle)
+        print("Test limit cycle extrapolation OK")
+
+
+# --- Model used by the statistical model checking tests ---
+def ramp_flow(x, t):
+    return [1.0]
+
+
+def ramp_guard(x):
+    return x[0] >= 1.0
+
+
+def ramp_factory(params):
+    automaton = create_automate()
+    add_discrete_state(automaton, "Q1")
+    add_discrete_state(automaton, "Q2")
+    define_continuous_space(automaton, ["x"])
+    set_initial_state(automaton, "Q1", [0.0])
+    set_flow(automaton, "Q1", ramp_flow)
+    set_flow(automaton, "Q2", ramp_flow)
+    set_guard(automaton, "Q1", "Q2", ramp_guard)
+    return automaton
+
+
+def uniform_x0(rng):
+    return [rng.random()]
+
+
+def failure_model(rate):
+    # BUSY -> DOWN after a random delay following rate
+    automaton = create_automate()
+    for q in ["BUSY", "DOWN"]:
+        add_discrete_state(automaton, q)
+        set_flow(automaton, q, lambda x, t: [1.0])
+    define_continuous_space(automaton, ["x"])
+    set_initial_state(automaton, "BUSY", [0.0])
+    set_rate(automaton, "BUSY", "DOWN", rate)
+    add_transition(automaton, "BUSY", "DOWN", rate=rate)
+    return automaton
+
+
+def failure_factory(params):
+    return failure_model(exponential(params.get("rate", 1.0)))
+
+
+class TestModelChecking(unittest.TestCase):
+    def setUp(self):
+        # x0 ~ U(0, 1): Q2 is reached before t = 0.5 with probability 1/2
+        self.run = randomized_run(ramp_factory, 0.01, 0.6, sample_x0=uniform_x0)
+        self.predicate = enters_within("Q2", 0.5)
+
+    def test_clopper_pearson(self):
+        lower, upper = clopper_pearson(5, 10, 0.05)
+        self.assertAlmostEqual(lower, 0.1871, places=4)
+        self.assertAlmostEqual(upper, 0.8129, places=4)
+        self.assertEqual(clopper_pearson(0, 10, 0.05)[0], 0.0)
+        print("Test Clopper-Pearson interval OK")
+
+    def test_estimate_probability(self):
+        result = estimate_probability(self.run, self.predicate, epsilon=0.1, delta=0.05)
+        lower, upper = result["interval"]
+        self.assertLessEqual(upper - lower, 0.2)
+        self.assertLess(lower, 0.5)
+        self.assertGreater(upper, 0.5)
+        self.assertLess(result["samples"], 185)  # Chernoff-Hoeffding sample size
+        print("Test probability estimation OK")
+
+    def test_sprt_parallel(self):
+        serial = sprt(self.run, self.predicate, theta=0.3, indifference=0.05)
+        parallel = sprt(
+            self.run, self.predicate, theta=0.3, indifference=0.05, workers=2
+        )
+        self.assertTrue(serial["verdict"])
+        self.assertEqual(serial, parallel)  # Seeds do not depend on the workers
+        self.assertFalse(sprt(self.run, self.predicate, theta=0.7)["verdict"])
+        print("Test SPRT OK")
+
+    def test_stochastic_runs(self):
+        # The stochastic transitions draw from a stream seeded by the sample
+        run = randomized_run(failure_factory, 0.01, 0.6)
+        predicate = enters_within("DOWN", 0.5)
+        results = [
+            estimate_probability(run, predicate, epsilon=0.1, seed=1, workers=workers)
+            for workers in (1, 1, 2)
+        ]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        lower, upper = results[0]["interval"]
+        self.assertLess(lower, 1.0 - math.exp(-0.5))
+        self.assertGreater(upper, 1.0 - math.exp(-0.5))
+        print("Test stochastic model checking OK")
+
+
+class TestSTLMonitor(unittest.TestCase):
+    def feed(self, monitor, samples):
+        for t, q, x in samples:
+            monitor.update(t, q, x)
+        return monitor.finish(samples[-1][0])
+
+    def test_sliding_windows(self):
+        samples = [
+            (float(k), "Q1", [float(v)]) for k, v in enumerate([0, 3, 1, 4, 1, 5])
+        ]
+        eventually = Eventually(0.0, 2.0, greater(0, 0.0))
+        always = Always(1.0, 2.0, greater(0, 0.0))
+        f_out, g_out = [], []
+        for t, q, x in samples:
+            f_out += eventually.push(t, q, x)
+            g_out += always.push(t, q, x)
+        f_out += eventually.close()
+        g_out += always.close()
+        self.assertEqual([rho for _, rho in f_out], [3, 4, 4, 5, 5, 5])
+        self.assertEqual([rho for _, rho in g_out], [1, 1, 1, 1, 5, float("inf")])
+        print("Test STL sliding windows OK")
+
+    def test_monitor_verdicts(self):
+        # Whenever in Q2, x stays below 3 and x reaches 2 within 1 s
+        spec = Implies(
+            in_mode("Q2"), And(less(0, 3.0), Eventually(0.0, 1.0, greater(0, 2.0)))
+        )
+        good = [(0.5 * k, "Q2" if k < 4 else "Q1", [float(k)]) for k in range(6)]
+        bad = [(0.5 * k, "Q2", [float(k)]) for k in range(10)]
+        monitor = STLMonitor(spec)
+        self.assertTrue(self.feed(monitor, good))
+        self.assertGreaterEqual(monitor.robustness, 0.0)
+        monitor = STLMonitor(spec)
+        self.assertFalse(self.feed(monitor, bad))
+        self.assertEqual(monitor.decided_at, 3.0)  # x(2.0) = 4 > 3, known at 2.0 + 1
+        print("Test STL monitor verdicts OK")
+
+    def test_simulation_stops_on_verdict(self):
+        automaton = create_automate()
+        add_discrete_state(automaton, "Q1")
+        define_continuous_space(automaton, ["x"])
+        set_initial_state(automaton, "Q1", [0.0])
+        set_flow(automaton, "Q1", lambda x, t: [1.0])
+        monitor = STLMonitor(less(0, 2.0))
+        trace = simulate(automaton, dt=0.1, t_max=10.0, monitors=[monitor])
+        self.assertFalse(monitor.verdict)
+        self.assertLess(trace[-1][0], 2.5)
+        monitor = STLMonitor(less(0, 2.0))
+        trace = simulate(
+            automaton, dt=0.1, t_max=10.0, monitors=[monitor], stop_when_decided=False
+        )
+        self.assertGreater(trace[-1][0], 9.9)
+        print("Test simulation stopped by monitor OK")
+
+
+class TestAutomatonBuilder(unittest.TestCase):
+    def test_build_structure(self):
+        def flow(x, t):
+            return [1.0]
+
+        def guard_up(x):
+            return x[0] >= 1.0
+
+        def reset_zero(x):
+            return [0.0]
+
+        builder = AutomatonBuilder()
+        self.assertEqual(builder.add_states(["Q1", "Q2", "Q1"]), [0, 1, 0])
+        builder.set_flows({"Q1": flow, "Q2": flow})
+        builder.add_transitions(
+            [
+                ("Q1", "Q2", None, guard_up, reset_zero),
+                {"q_from": "Q2", "q_to": "Q1", "event": "alpha"},
+            ]
+        )
+        automaton = builder.build()
+        self.assertEqual(automaton["Q"], ["Q1", "Q2"])
+        self.assertEqual(
+            automaton["T"][0],
+            {
+                "q_from": "Q1",
+                "q_to": "Q2",
+                "event": None,
+                "guard": "guard_up",
+                "reset": "reset_zero",
+            },
+        )
+        self.assertEqual(automaton["T"][1]["event"], "alpha")
+        self.assertIs(automaton["Guard"]["Q1"]["Q2"], guard_up)
+        self.assertIsNone(automaton["Guard"]["Q2"]["Q1"])
+        self.assertIs(automaton["Jump"]["Q1"]["Q2"], reset_zero)
+        self.assertEqual(automaton["Event"]["Q2"]["Q1"], "alpha")
+        # Adding an event to an edge keeps its guard
+        builder.add_transition("Q1", "Q2", event="beta")
+        self.assertIs(automaton["Guard"]["Q1"]["Q2"], guard_up)
+        with self.assertRaises(ValueError):
+            builder.add_transition("Q1", "Q3")
+        with self.assertRaises(ValueError):
+            builder.set_flow("Q3", flow)
+        print("Test builder structure OK")
+
+    def test_large_chain(self):
+        n = 20000
+        builder = AutomatonBuilder()
+        builder.add_states(f"Q{i}" for i in range(n))
+        builder.add_transitions((f"Q{i}", f"Q{i + 1}", "go") for i in range(n - 1))
+        automaton = builder.build()
+        self.assertEqual(len(automaton["Q"]), n)
+        self.assertEqual(len(automaton["T"]), n - 1)
+        self.assertEqual(automaton["T"][-1]["q_to"], f"Q{n - 1}")
+        builder.add_transition(f"Q{n - 1}", "Q0")
+        self.assertEqual(len(builder.build()["T"]), n)  # Only the new one is added
+        print("Test builder large chain OK")
+
+
+class TestHtPNConverter(unittest.TestCase):
+    def test_convert_model(self):
+        with open(MACHINE_MODEL, "r") as f:
+            data = json.load(f)
+        model = convert_automate_to_htpn(data)
+        self.assertEqual([p["name"] for p in model["places"]], ["Q1", "Q2", "Q3"])
+        self.assertEqual(len(model["transitions"]), 4)
+        self.assertEqual(model["pre"][0], ("Q1", "T1"))
+        self.assertEqual(model["post"][0], ("T1", "Q2"))
+        self.assertEqual(model["transitions"][0]["event"], "alpha")
+        self.assertEqual(model["M0"], ["Q1"])
+        print("Test HtPN model OK")
+
+    def test_convert_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exports = os.path.join(tmp, "exports")
+            os.makedirs(exports)
+            for path in [MACHINE_MODEL, THERMOSTAT_MODEL]:
+                with (
+                    open(path, "r") as f,
+                    open(os.path.join(exports, os.path.basename(path)), "w") as g,
+                ):
+                    g.write(f.read())
+            output = os.path.join(tmp, "htpn")
+            result = convert_directory(exports, output, workers=2)
+            self.assertEqual(len(result["converted"]), 2)
+
+            namespace = {}
+            with open(os.path.join(output, "automate_thermostat_htpn.py")) as f:
+                exec(f.read(), namespace)
+            self.assertEqual(namespace["M0"], ["Q1"])
+            self.assertEqual(namespace["DYNAMICS"]["Q2"]([70.0], 0.0), [10.0])
+            self.assertTrue(namespace["GUARDS"]["T1"]([69.0]))
+
+            # Only the modified automaton is converted again
+            with open(os.path.join(exports, "automate_thermostat.txt"), "a") as f:
+                f.write("\n")
+            result = convert_directory(exports, output, workers=2)
+            self.assertEqual(len(result["converted"]), 1)
+            self.assertEqual(len(result["skipped"]), 1)
+        print("Test HtPN directory conversion OK")
+
+
+class TestStochastic(unittest.TestCase):
+    def failure_time(self, trace):
+        return next(t for t, q, _ in trace if q == "DOWN")
+
+    def test_exponential_failures(self):
+        times = []
+        for stream in spawn_streams(7, 300):
+            trace = simulate(failure_model(exponential(2.0)), 0.01, 10.0, rng=stream)
+            times.append(self.failure_time(trace))
+        mean = sum(times) / len(times)
+        self.assertAlmostEqual(mean, 0.5, delta=0.1)
+        print("Test exponential transitions OK")
+
+    def test_thinning(self):
+        # Rate 4 once x >= 1, 0 before: the failure happens after t = 1
+        def rate_after_one(x, t):
+            return 4.0 if x[0] >= 1.0 else 0.0
+
+        times = []
+        for stream in spawn_streams(3, 200):
+            automaton = failure_model(intensity(rate_after_one, 4.0))
+            times.append(self.failure_time(simulate(automaton, 0.01, 20.0, rng=stream)))
+        self.assertGreaterEqual(min(times), 1.0)
+        self.assertAlmostEqual(sum(times) / len(times), 1.25, delta=0.1)
+        print("Test intensity transitions OK")
+
+    def test_reproducibility(self):
+        first = simulate(failure_model(weibull(2.0, 1.0)), 0.01, 5.0, rng=42)
+        second = simulate(failure_model(weibull(2.0, 1.0)), 0.01, 5.0, rng=42)
+        self.assertEqual(list(first.codes), list(second.codes))
+        self.assertEqual(
+            failure_model(exponential(1.0))["T"][0]["rate"]["law"], "exponential"
+        )
+        print("Test stochastic reproducibility OK")
+
+    def test_batch_sampling(self):
+        delays = sample_delays(exponential(4.0), 20000, RandomStream(1))
+        self.assertAlmostEqual(sum(delays) / len(delays), 0.25, delta=0.01)
+        with self.assertRaises(ValueError):
+            exponential(-1.0)
+        print("Test batch sampling OK")
+
+
+class TestSensitivity(unittest.TestCase):
+    def relaxation(self, params):
+        # x' = a - x, x(0) = b
+        automaton = create_automate()
+        add_discrete_state(automaton, "Q1")
+        define_continuous_space(automaton, ["x"])
+        set_flow(automaton, "Q1", lambda x, t: [params["a"] - x[0]])
+        set_initial_state(automaton, "Q1", [params["b"]])
+        return automaton
+
+    def switching(self, params):
+        # x' = 1 until x >= c, then x is reset to 0 and x' = 2
+        automaton = create_automate()
+        for q in ["Q1", "Q2"]:
+            add_discrete_state(automaton, q)
+        define_continuous_space(automaton, ["x"])
+        set_flow(automaton, "Q1", lambda x, t: [1.0])
+        set_flow(automaton, "Q2", lambda x, t: [2.0])
+        set_guard(automaton, "Q1", "Q2", lambda x: x[0] >= params["c"])
+        set_jump(automaton, "Q1", "Q2", lambda x: [0.0])
+        set_initial_state(automaton, "Q1", [0.0])
+        return automaton
+
+    def test_flow_sensitivities(self):
+        trace, sensitivities = simulate_sensitivity(
+            self.relaxation, {"a": 2.0, "b": 1.0}, 0.1, 1.0
+        )
+        self.assertEqual(len(sensitivities), len(trace))
+        # Euler scheme: dx/da = 1 - (1 - dt)^k and dx/db = (1 - dt)^k
+        k = len(trace) - 1
+        dxda, dxdb = sensitivities[-1][0]
+        self.assertAlmostEqual(dxda, 1 - 0.9**k, places=6)
+        self.assertAlmostEqual(dxdb, 0.9**k, places=6)
+        print("Test flow sensitivities OK")
+
+    def test_saltation(self):
+        # x(t) = 2 (t - c) after the jump: dx/dc = -2
+        surfaces = {("Q1", "Q2"): lambda x, params: x[0] - params["c"]}
+        trace, sensitivities = simulate_sensitivity(
+            self.switching, {"c": 1.0}, 0.01, 3.0, surfaces=surfaces
+        )
+        self.assertEqual(trace[-1][1], "Q2")
+        self.assertAlmostEqual(sensitivities[-1][0][0], -2.0, places=6)
+
+        zero = lambda *args: [[0.0]]  # noqa: E731
+        jacobians = {
+            "flow": {"Q1": (zero, zero), "Q2": (zero, zero)},
+            "Jump": {("Q1", "Q2"): (zero, zero)},
+        }
+        _, exact = simulate_sensitivity(
+            self.switching, {"c": 1.0}, 0.01, 3.0, None, surfaces, jacobians
+        )
+        self.assertAlmostEqual(exact[-1][0][0], -2.0, places=9)
+        with self.assertRaises(ValueError):
+            simulate_sensitivity(self.switching, {"c": 1.0}, 0.01, 3.0)
+        print("Test saltation at jumps OK")
+
+
+# --- Model used by the calibration tests ---
+def relaxation_flow(a, x, t):
+    return [a - x[0]]
+
+
+def relaxation_factory(params):
+    # x' = a - x, x(0) = b
+    automaton = create_automate()
+    add_discrete_state(automaton, "Q1")
+    define_continuous_space(automaton, ["x"])
+    set_flow(automaton, "Q1", partial(relaxation_flow, params["a"]))
+    set_initial_state(automaton, "Q1", [params["b"]])
+    return automaton
+
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        trace = simulate(relaxation_factory({"a": 2.0, "b": 0.5}), 0.05, 3.0)
+        self.data = [sample for i, sample in enumerate(trace) if i % 5 == 0]
+
+    def test_loss(self):
+        trace = simulate(relaxation_factory({"a": 2.0, "b": 0.5}), 0.05, 3.0)
+        self.assertAlmostEqual(trace_loss(trace, self.data), 0.0)
+        self.assertGreater(trace_loss(trace, [(1.0, "Q2", [None])]), 0.0)
+        # Hopeless run: stopped as soon as the loss exceeds the bound
+        monitor = LossMonitor(self.data, bound=0.1)
+        short = simulate(
+            relaxation_factory({"a": 4.0, "b": 0.5}), 0.05, 3.0, monitors=[monitor]
+        )
+        self.assertFalse(monitor.verdict)
+        self.assertLess(len(short), len(trace))
+        print("Test calibration loss OK")
+
+    def test_differential_evolution(self):
+        calibration = Calibration(relaxation_factory, self.data, dt=0.05)
+        result = calibration.differential_evolution(
+            {"a": (0.0, 5.0), "b": (-1.0, 1.0)},
+            population_size=10,
+            generations=40,
+            seed=1,
+        )
+        self.assertAlmostEqual(result["params"]["a"], 2.0, places=2)
+        self.assertAlmostEqual(result["params"]["b"], 0.5, places=2)
+        self.assertLessEqual(result["history"][-1], result["history"][0])
+        # Evaluations are cached
+        evaluations = calibration.evaluations
+        calibration.loss(result["params"])
+        self.assertEqual(calibration.evaluations, evaluations)
+        print("Test differential evolution OK")
+
+    def test_parallel_population(self):
+        population = [{"a": a, "b": 0.0} for a in (1.0, 2.0, 3.0, 2.0)]
+        serial = Calibration(relaxation_factory, self.data, dt=0.05)
+        parallel = Calibration(relaxation_factory, self.data, dt=0.05, workers=2)
+        self.assertEqual(serial.evaluate(population), parallel.evaluate(population))
+        self.assertEqual(parallel.evaluations, 3)  # Duplicated candidate
+        print("Test parallel population evaluation OK")
+
+    def test_gauss_newton(self):
+        calibration = Calibration(relaxation_factory, self.data, dt=0.05)
+        result = calibration.gauss_newton({"a": 1.0, "b": 0.0})
+        self.assertAlmostEqual(result["params"]["a"], 2.0, places=6)
+        self.assertAlmostEqual(result["params"]["b"], 0.5, places=6)
+        self.assertLess(result["evaluations"], 30)
+        print("Test Gauss-Newton calibration OK")
+
+
+class TestTraceWriter(unittest.TestCase):
+    def automaton(self):
+        automaton = create_automate()
+        for q in ["Q1", "Q2"]:
+            add_discrete_state(automaton, q)
+        define_continuous_space(automaton, ["x", "y"])
+        set_initial_state(automaton, "Q1", [0.0, 1.0])
+        set_flow(automaton, "Q1", lambda x, t: [1.0, -x[1]])
+        set_flow(automaton, "Q2", lambda x, t: [-1.0, -x[1]])
+        set_guard(automaton, "Q1", "Q2", lambda x: x[0] >= 1.0)
+        set_guard(automaton, "Q2", "Q1", lambda x: x[0] <= 0.0)
+        return automaton
+
+    def test_background_writing(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.hat")
+            for compression in ["zlib", "lzma", None]:
+                with TraceWriter(
+                    path,
+                    ["x", "y"],
+                    chunk_size=64,
+                    max_pending=1,
+                    compression=compression,
+                ) as writer:
+                    trace = simulate(self.automaton(), 0.01, 5.0, writer=writer)
+                stats = writer.stats()
+                self.assertEqual(stats["samples"], len(trace))
+                self.assertEqual(stats["chunks"], -(-len(trace) // 64))
+                if compression:
+                    self.assertGreater(stats["compression_ratio"], 1.0)
+                written = read_trace(path)
+                self.assertEqual(list(written.t), list(trace.t))
+                self.assertEqual(list(written.column("y")), list(trace.column("y")))
+                self.assertEqual([q for _, q, _ in written], [q for _, q, _ in trace])
+        print("Test background trace writer OK")
+
+    def test_writer_errors(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "trace.hat")
+            with self.assertRaises(ValueError):
+                TraceWriter(path, ["x", "y"], compression="zip")
+
+            def failing(data, level):
+                raise OSError("disk full")
+
+            writer = TraceWriter(path, ["x", "y"], chunk_size=16)
+            writer._compress = failing
+            with self.assertRaises(OSError):  # Raised in the writer thread
+                try:
+                    simulate(self.automaton(), 0.01, 5.0, writer=writer)
+                finally:
+                    writer.close()
+
+            # The samples recorded before a failure of the model are kept
+            times = []
+
+            def failing_flow(x, t):
+                times.append(t)
+                if t >= 0.9:
+                    raise ZeroDivisionError("model error")
+                return [1.0, -x[1]]
+
+            automaton = self.automaton()
+            set_flow(automaton, "Q1", failing_flow)
+            with self.assertRaises(ZeroDivisionError):
+                with TraceWriter(path, ["x", "y"], chunk_size=64) as writer:
+                    simulate(automaton, 0.01, 5.0, writer=writer)
+            written = read_trace(path)
+            self.assertEqual(list(written.t), times)
+            self.assertNotEqual(len(times) % 64, 0)  # Part of a chunk
+
+            writer = TraceWriter(path, ["x", "y"])
+            writer.close()
+            with self.assertRaises(ValueError):
+                writer.write(Trace(["x", "y"]))
+        print("Test trace writer errors OK")
+
+
+THRESHOLD = 75.0
+
+
+class TestResultCache(unittest.TestCase):
+    def thermostat(self, target=50.0):
+        automaton = create_automate()
+        define_continuous_space(automaton, ["x"])
+        for q in ["Q1", "Q2", "Q3"]:
+            add_discrete_state(automaton, q)
+        define_event_set(automaton, ["alpha"])
+        set_initial_state(automaton, "Q1", [72.0])
+        set_flow(automaton, "Q1", lambda x, t: [-x[0] + target])
+        set_flow(automaton, "Q2", lambda x, t: [-x[0] + 80])
+        set_flow(automaton, "Q3", lambda x, t: [0.0])
+        set_guard(automaton, "Q1", "Q2", lambda x: x[0] <= 70)
+        set_guard(automaton, "Q2", "Q1", lambda x: x[0] >= THRESHOLD)
+        set_guard(automaton, "Q2", "Q3", None)
+        set_event(automaton, "Q2", "Q3", "alpha")
+        return automaton
+
+    def assertSameTrace(self, first, second):
+        self.assertEqual(list(first.t), list(second.t))
+        self.assertEqual([q for _, q, _ in first], [q for _, q, _ in second])
+        self.assertEqual(list(first.column("x")), list(second.column("x")))
+
+    def test_key(self):
+        global THRESHOLD
+        schedule = [(3.0, "alpha", True)]
+        key = run_key(self.thermostat(), 0.01, schedule)
+        self.assertEqual(key, run_key(self.thermostat(), 0.01, schedule))
+        self.assertNotEqual(key, run_key(self.thermostat(51.0), 0.01, schedule))
+        self.assertNotEqual(key, run_key(self.thermostat(), 0.02, schedule))
+        self.assertNotEqual(key, run_key(self.thermostat(), 0.01, None))
+        THRESHOLD = 76.0  # Global constant used by a guard
+        try:
+            self.assertNotEqual(key, run_key(self.thermostat(), 0.01, schedule))
+        finally:
+            THRESHOLD = 75.0
+        print("Test result cache key OK")
+
+    def test_key_large_input(self):
+        # The samples of a memory-mapped signal are hashed as bytes
+        automaton = self.thermostat()
+        define_input_space(automaton, ["u"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "signal.npy")
+            n = 2 * 10**6
+            samples = np.lib.format.open_memmap(
+                path, mode="w+", dtype=float, shape=(n, 2)
+            )
+            samples[:, 0] = np.arange(n) * 0.01
+            samples[:, 1] = 20.0
+            samples.flush()
+            set_input(automaton, "u", load_input_signal(path))
+            start = time.perf_counter()
+            key = run_key(automaton, 0.01)
+            self.assertLess(time.perf_counter() - start, 1.0)
+            self.assertEqual(key, run_key(automaton, 0.01))
+            samples[-1, 1] = 21.0  # Seen through the memory map of the signal
+            samples.flush()
+            self.assertNotEqual(key, run_key(automaton, 0.01))
+            del samples  # Releases the memory maps before removing the file
+            automaton["Input"].clear()
+        print("Test result cache key of a large input OK")
+
+    def test_reuse(self):
+        schedule = [(3.0, "alpha", True)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResultCache(tmpdir)
+            cache.simulate(self.thermostat(), 0.01, 2.0, schedule)
+            longer = cache.simulate(self.thermostat(), 0.01, 5.0, schedule)
+            self.assertSameTrace(
+                longer, simulate(self.thermostat(), 0.01, 5.0, schedule)
+            )
+            shorter = ResultCache(tmpdir).simulate(
+                self.thermostat(), 0.01, 1.0, schedule
+            )
+            self.assertSameTrace(
+                shorter, simulate(self.thermostat(), 0.01, 1.0, schedule)
+            )
+            self.assertEqual((cache.misses, cache.extended), (1, 1))
+            summary = cache.summary(self.thermostat(), 0.01, 5.0, schedule)
+            self.assertEqual(
+                summary, cache.summary(self.thermostat(), 0.01, 5.0, schedule)
+            )
+            self.assertEqual(summary["final_state"]["q"], "Q3")
+            self.assertEqual(cache.hits, 2)
+        print("Test result cache reuse OK")
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResultCache(tmpdir, max_bytes=1)
+            cache.simulate(self.thermostat(), 0.01, 2.0)
+            cache.simulate(self.thermostat(51.0), 0.01, 2.0)
+            self.assertEqual([f for f in os.listdir(tmpdir) if f.endswith(".hat")], [])
+            cache = ResultCache(tmpdir)
+            for target in (50.0, 51.0, 50.0):
+                cache.simulate(self.thermostat(target), 0.01, 2.0)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+        print("Test result cache eviction OK")
+
+
+class TestFastForward(unittest.TestCase):
+    def machine(self):
+        # Idle in Q1 until alpha, works in Q2 until x >= 1
+        automaton = create_automate()
+        for q in ["Q1", "Q2"]:
+            add_discrete_state(automaton, q)
+        define_continuous_space(automaton, ["x"])
+        set_initial_state(automaton, "Q1", [0.0])
+        set_flow(automaton, "Q1", lambda x, t: [0.0])
+        set_flow(automaton, "Q2", lambda x, t: [1.0])
+        set_guard(automaton, "Q1", "Q2", None)
+        set_event(automaton, "Q1", "Q2", "alpha")
+        set_guard(automaton, "Q2", "Q1", lambda x: x[0] >= 1.0)
+        set_jump(automaton, "Q2", "Q1", lambda x: [0.0])
+        return automaton
+
+    def test_constant_flows(self):
+        offset = 1.0
+        self.assertTrue(is_constant_flow(lambda x, t: [0.0, 0.0]))
+        self.assertTrue(is_constant_flow(lambda x, t: [2.5, 1.0]))
+        self.assertFalse(is_constant_flow(lambda x, t: [-x[0]]))
+        self.assertFalse(is_constant_flow(lambda x, t: [offset]))
+        self.assertFalse(is_constant_flow(partial(relaxation_flow, 1.0)))
+        print("Test constant flows OK")
+
+    def test_idle_modes(self):
+        schedule = []
+        for k in range(5):
+            schedule += [
+                (10.0 * k + 5.0, "alpha", True),
+                (10.0 * k + 5.02, "alpha", False),
+            ]
+        stepped = simulate(self.machine(), 0.01, 50.0, schedule)
+        skipped = simulate(self.machine(), 0.01, 50.0, schedule, fast_forward=True)
+        self.assertEqual(transition_counts(skipped), transition_counts(stepped))
+        self.assertEqual(transition_counts(skipped), {("Q1", "Q2"): 5, ("Q2", "Q1"): 5})
+        self.assertLess(len(skipped), len(stepped) // 4)
+        # t jumps to the times reached by the stepping, rounding included
+        self.assertEqual(skipped[-1][0], stepped[-1][0])
+        self.assertEqual(list(transition_log(skipped)), list(transition_log(stepped)))
+        machine = [
+            simulate(
+                load_automate_from_txt(MACHINE_MODEL),
+                0.001,
+                12.0,
+                [(5.0, "alpha", True), (5.002, "alpha", False)],
+                fast_forward=fast_forward,
+            )
+            for fast_forward in (False, True)
+        ]
+        self.assertEqual(
+            list(transition_log(machine[1])), list(transition_log(machine[0]))
+        )
+        print("Test idle mode fast-forward OK")
+
+    def test_stochastic_idle_mode(self):
+        for seed in range(5):
+            stepped = simulate(failure_model(exponential(0.5)), 0.01, 20.0, rng=seed)
+            skipped = simulate(
+                failure_model(exponential(0.5)), 0.01, 20.0, rng=seed, fast_forward=True
+            )
+            self.assertEqual(transition_counts(skipped), transition_counts(stepped))
+            self.assertEqual(
+                [round(t, 6) for t, _, _ in transition_log(skipped)],
+                [round(t, 6) for t, _, _ in transition_log(stepped)],
+            )
+        print("Test stochastic fast-forward OK")
+
+
+class TestFleet(unittest.TestCase):
+    def repairable(self):
+        # UP -> DOWN at rate 1, DOWN -> UP at rate 3: DOWN 1/4 of the time
+        automaton = create_automate()
+        for q in ["UP", "DOWN"]:
+            add_discrete_state(automaton, q)
+            set_flow(automaton, q, lambda x, t: [0.0])
+        define_continuous_space(automaton, ["x"])
+        set_initial_state(automaton, "UP", [0.0])
+        set_rate(automaton, "UP", "DOWN", exponential(1.0))
+        set_rate(automaton, "DOWN", "UP", exponential(3.0))
+        return automaton
+
+    def test_deterministic_fleet(self):
+        schedule = [(1.0, "alpha", True), (1.02, "alpha", False)]
+        trace = simulate(load_automate_from_txt(MACHINE_MODEL), 0.01, 8.0, schedule)
+        fleet = Fleet(load_automate_from_txt(MACHINE_MODEL), 3, dt=0.01)
+        for time, name, value in schedule:
+            fleet.schedule_event(time, name, value, instances=[0, 2])
+        fleet.run(8.0)
+        self.assertEqual(fleet.counts, {"Q1": 1, "Q2": 0, "Q3": 2})
+        self.assertEqual(fleet.transitions, 4)
+        times, counts = fleet.occupancy("Q3")
+        self.assertEqual(list(counts), [0, 1, 2])
+        # Transitions happen at the same step as in simulate, up to one dt
+        failure = next(t for t, _, q in transition_log(trace) if q == "Q3")
+        self.assertAlmostEqual(times[-1], failure, delta=0.01 + 1e-9)
+        self.assertEqual(fleet.state(0)[0], "Q3")
+        self.assertEqual(fleet.state(1), ("Q1", [0.0, 0.0]))
+        with self.assertRaises(ValueError):
+            Fleet(relaxation_factory({"a": 1.0, "b": 0.0}), 2)  # x' = a - x
+        print("Test deterministic fleet OK")
+
+    def test_fleet_occupancy(self):
+        fleet = Fleet(self.repairable(), 2000, rng=3).run(10.0)
+        fleet.run(20.0)  # The fleet can be advanced in several runs
+        self.assertEqual(sum(fleet.counts.values()), 2000)
+        times, counts = fleet.occupancy("DOWN")
+        self.assertEqual(len(times), fleet.transitions + 1)
+        self.assertEqual(counts[-1], fleet.counts["DOWN"])
+        # Mean of 1/4 (1 - exp(-4 t)) over [0, 20]
+        expected = 2000 * 0.25 * (1 - 1 / 80)
+        self.assertAlmostEqual(fleet.mean_occupancy("DOWN"), expected, delta=15)
+        print("Test fleet occupancy OK")
+
+
+class TestCommandLine(unittest.TestCase):
+    MODEL = MACHINE_MODEL
+
+    def test_load_automate(self):
+        automaton = load_automate_from_txt(self.MODEL)
+        self.assertEqual(automaton["Q"], ["Q1", "Q2", "Q3"])
+        self.assertEqual(automaton["q"], "Q1")
+        self.assertEqual(automaton["Event"]["Q1"]["Q2"], "alpha")
+        self.assertIsNone(automaton["Guard"]["Q1"]["Q2"])
+        self.assertTrue(automaton["Guard"]["Q2"]["Q3"]([0.0, 3.0]))
+        self.assertIn(
+            "def flow_Q2", collect_functions(automaton["flow"]["Q2"])["flow_Q2"]
+        )
+        print("Test load exported automaton OK")
+
+    def test_headless_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = os.path.join(tmp, "trace.csv")
+            summary_path = os.path.join(tmp, "summary.json")
+            record_path = os.path.join(tmp, "trace.hat")
+            ha_main(
+                [
+                    self.MODEL,
+                    "--dt=0.01",
+                    "--t-max=8",
+                    "--event=1.0:alpha:true",
+                    "--event=1.02:alpha:false",
+                    "--trace",
+                    trace_path,
+                    "--summary",
+                    summary_path,
+                    "--record",
+                    record_path,
+                ]
+            )
+            recorded = read_trace(record_path)
+            with open(summary_path, "r") as f:
+                summary = json.load(f)
+            with open(trace_path, "r") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(summary["final_state"]["q"], "Q3")  # tau reached 3 in Q2
+        self.assertEqual(summary["transitions"], {"Q1->Q2": 1, "Q2->Q3": 1})
+        self.assertEqual(lines[0], "t,q,x,tau")
+        self.assertEqual(len(lines), summary["samples"] + 1)
+        self.assertEqual(len(recorded), summary["samples"])
+        print("Test headless run OK")
+
+    def test_lazy_imports(self):
+        code = "import sys, ha, Simulation, VisuelAutomate; print(sorted(m for m in ('matplotlib', 'graphviz') if m in sys.modules))"
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=SOURCES,
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+        print("Test lazy imports OK")
@@ -153,10 +153,14 @@ functions = collect_functions(
 )
 
 # Export the automaton and its functions to a text file
-export_automate_to_txt_with_functions(A, "automate_machine.txt", functions)
+export_automate_to_txt_with_functions(
+    A, "automate_machine.txt", functions, directory="MachineRep_Results"
+)
 
 # Visualize the automaton
-visualiser_automate(A, filename="automate_machine", functions=functions)
+visualiser_automate(
+    A, filename="automate_machine", functions=functions, directory="MachineRep_Results"
+)
 
 # === Event Scheduling ===
 """